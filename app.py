@@ -7,17 +7,27 @@ from flask import (
     stream_with_context,
 )
 from generate_podcast_audio import generate_podcast_audio
-from gemini_handler import generate_conversation
+from gemini_handler import generate_conversation, script_cache, stream_conversation_turns
 from dotenv import load_dotenv
 import json
 import queue
 import threading
 import time
 import os
-import tempfile
-import shutil
 import uuid
-from google_tts import combine_audio_files, OutputFormat, get_supported_stream
+from audio_assembly import assembler_from_settings
+from task_store import create_task_store
+from job_queue import JobExecutor, QueueFull
+from google_tts import (
+    audio_cache,
+    audio_file_writer,
+    OutputFormat,
+    PassthroughStream,
+    StreamEncoder,
+    client_pool,
+    decode_to_pcm,
+    plan_audio,
+)
 
 # Load environment variables from .env file
 load_dotenv()
@@ -28,32 +38,53 @@ app = Flask(__name__)
 FLASK_PORT = int(os.getenv("FLASK_PORT", 5000))
 OUTPUT_FOLDER = "static/output"  # Folder to save generated audio files
 
-# Global dictionary to track audio generation tasks
-# Key: task_id, Value: {'queue': Queue, 'status': '...', 'metadata': {...}, 'waiting': True/False, 'file_path': '...', 'timestamp': float}
-audio_tasks = {}
+# Store tracking audio generation tasks and handing stream chunks to listeners.
+# Use a sqlite:// or redis:// URL to share tasks between worker processes.
+# Task info: {'status': '...', 'metadata': {...}, 'waiting': True/False, 'file_path': '...', 'output_format': '...', 'stream_type': '...', 'timestamp': float, 'queue_position': int, 'queue_depth': int}
+TASK_STORE_URL = os.getenv("TASK_STORE_URL", "memory://")
+audio_tasks = create_task_store(TASK_STORE_URL)
 
 # Configuration for cleanup
 TASK_EXPIRATION_SECONDS = 3600  # 1 hour (adjust as needed)
 
-# Sentinel object to signal the end of the audio stream
-END_OF_STREAM_SENTINEL = object()
+# Audio generation runs on a fixed pool of workers with a bounded backlog.
+# Requests beyond the backlog are rejected with 429 and a Retry-After header.
+AUDIO_WORKERS = int(os.getenv("AUDIO_WORKERS", 2))
+AUDIO_QUEUE_SIZE = int(os.getenv("AUDIO_QUEUE_SIZE", 10))
+audio_executor = JobExecutor(
+    max_workers=AUDIO_WORKERS, max_pending=AUDIO_QUEUE_SIZE, name="audio-worker"
+)
+# Requests may ask for a priority from 0 (first) to MAX_PRIORITY (last)
+DEFAULT_PRIORITY = 0
+MAX_PRIORITY = 9
+
+# How often /events re-reads a task when no local change was reported (changes
+# from other processes are only seen this way), and the keep-alive interval
+EVENTS_POLL_SECONDS = 1.0 if audio_tasks.shared else 15.0
+EVENTS_KEEPALIVE_SECONDS = 15.0
+
+# Warm the TextToSpeech client pool so the first podcast skips channel setup
+try:
+    client_pool.warm()
+except Exception as e:
+    print(f"Could not warm TextToSpeech client pool: {e}")
+
+
+def cache_stats_snapshot():
+    """Hit/miss counters and usage of this process's caches."""
+    return {"audio": audio_cache.stats(), "script": script_cache.stats()}
 
 
 def cleanup_old_tasks():
     """Periodically removes old tasks from audio_tasks."""
     while True:
-        now = time.time()
-        expired_tasks = []
-        for task_id, task_info in audio_tasks.items():
-            if (
-                "timestamp" in task_info
-                and now - task_info["timestamp"] > TASK_EXPIRATION_SECONDS
-            ):
-                expired_tasks.append(task_id)
-
-        for task_id in expired_tasks:
+        for task_id in audio_tasks.delete_expired(TASK_EXPIRATION_SECONDS):
             print(f"Removing expired task: {task_id}")
-            del audio_tasks[task_id]  # Remove the task
+
+        # Replace TTS clients whose channels have gone bad while idle
+        client_pool.health_check()
+
+        print(f"Cache stats: {json.dumps(cache_stats_snapshot())}")
 
         time.sleep(600)  # Check every 10 minutes (adjust as needed)
 
@@ -96,166 +127,407 @@ def generate_audio():
         settings = request.json.get("settings", {})
         supported_stream_type = request.json.get("supportedStreamType", "audio/mpeg")
         output_format = OutputFormat(settings.get("outputFormat", "wav"))
+        priority = parse_priority(request.json.get("priority"))
+
+        return submit_audio_task(
+            generate_audio_task,
+            (conversation_json, settings, supported_stream_type),
+            output_format,
+            supported_stream_type,
+            priority,
+        )
 
-        # Generate a unique task ID
-        task_id = str(uuid.uuid4())
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)})
 
-        # Create a queue to hold audio chunks
-        audio_queue = queue.Queue()
 
-        # Create the output directory if it doesn't exist
-        os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+@app.route("/generate/podcast", methods=["POST"])
+def generate_podcast():
+    """Writes the script and voices it in one task, starting audio with the first turns."""
+    try:
+        if not request.json or "topic" not in request.json:
+            return jsonify({"success": False, "error": "No topic provided"})
 
-        # Generate the output file path
-        unique_filename = f"podcast-{task_id}.{output_format.value}"
-        output_file_path = os.path.join(OUTPUT_FOLDER, unique_filename)
+        topic = request.json["topic"]
+        script_settings = request.json.get("settings", {})
+        audio_settings = request.json.get("audioSettings", {})
+        supported_stream_type = request.json.get("supportedStreamType", "audio/mpeg")
+        output_format = OutputFormat(audio_settings.get("outputFormat", "wav"))
+        priority = parse_priority(request.json.get("priority"))
+
+        return submit_audio_task(
+            generate_podcast_task,
+            (topic, script_settings, audio_settings, supported_stream_type),
+            output_format,
+            supported_stream_type,
+            priority,
+        )
 
-        # Store task information
-        audio_tasks[task_id] = {
-            "queue": audio_queue,
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)})
+
+
+def parse_priority(value):
+    """Clamp a requested priority to 0..MAX_PRIORITY, ignoring values that aren't numbers."""
+    try:
+        priority = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_PRIORITY
+    return min(max(priority, 0), MAX_PRIORITY)
+
+
+def submit_audio_task(task, args, output_format, supported_stream_type, priority):
+    """
+    Create an audio task and queue `task(task_id, *args)` on the worker pool.
+
+    Returns the response for the request: the task ID, or 429 with a
+    Retry-After header when the queue is full.
+    """
+    # Generate a unique task ID
+    task_id = str(uuid.uuid4())
+
+    # Create the output directory if it doesn't exist
+    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+
+    # Generate the output file path
+    unique_filename = f"podcast-{task_id}.{output_format.value}"
+    output_file_path = os.path.join(OUTPUT_FOLDER, unique_filename)
+
+    # Store task information
+    audio_tasks.create(
+        task_id,
+        {
             "status": "pending",
             "metadata": {},  # You can add initial metadata here if needed
             "waiting": False,
             "file_path": output_file_path,
-            "output_format": output_format,
+            "output_format": output_format.value,
+            "stream_type": supported_stream_type,
             "timestamp": time.time(),  # Add timestamp
-        }
+        },
+    )
 
-        # Start audio generation in a separate thread
-        audio_thread = threading.Thread(
-            target=generate_audio_task,
-            args=(
-                task_id,
-                conversation_json,
-                settings,
-                supported_stream_type,
-                audio_queue,
-            ),
-        )
-        audio_thread.daemon = True  # Set as a daemon thread
-        audio_thread.start()
+    # Queue audio generation on the worker pool
+    try:
+        audio_executor.submit(task_id, task, task_id, *args, priority=priority)
+    except QueueFull as e:
+        audio_tasks.delete(task_id)
+        response = jsonify({"success": False, "error": str(e)})
+        response.headers["Retry-After"] = str(e.retry_after)
+        return response, 429
+
+    # Record the queue position for status requests served by other processes
+    audio_tasks.update(
+        task_id,
+        queue_position=audio_executor.position(task_id),
+        queue_depth=audio_executor.depth(),
+    )
+
+    # Return the task ID immediately
+    return jsonify({"success": True, "task_id": task_id})
+
+
+def generate_podcast_task(
+    task_id, topic, script_settings, audio_settings, supported_stream_type
+):
+    """Streams the script from Gemini straight into audio generation."""
 
-        # Return the task ID immediately
-        return jsonify({"success": True, "task_id": task_id})
+    def on_script(conversation_json):
+        # Keep the full script so clients can show it once the task completes
+        audio_tasks.update(task_id, conversation=conversation_json)
 
-    except Exception as e:
-        return jsonify({"success": False, "error": str(e)})
+    turns = stream_conversation_turns(topic, script_settings, on_script=on_script)
+    generate_audio_task(task_id, turns, audio_settings, supported_stream_type)
 
 
-def generate_audio_task(
-    task_id, conversation_json, settings, supported_stream_type, audio_queue
-):
-    """Generates audio data, puts it into the queue, and saves to file on completion."""
-    audio_tasks[task_id]["status"] = "in_progress"
-    temp_json_fd, temp_json_path = tempfile.mkstemp(suffix=".json")
-    temp_dir = tempfile.mkdtemp()
-    audio_files = []  # List to store temporary audio chunk file paths
-    output_format = audio_tasks[task_id]["output_format"]
+def generate_audio_task(task_id, conversation_json, settings, supported_stream_type):
+    """Generates audio data, hands it to stream listeners, and writes it to the output file as it arrives."""
+    task_info = audio_tasks.get(task_id)
+    if task_info is None:
+        print(f"Task {task_id} was removed before it started")
+        return
+    audio_tasks.update(task_id, status="in_progress")
+    started_at = time.time()
+    output_format = OutputFormat(task_info["output_format"])
+    output_file_path = task_info["file_path"]
+    stream_encoder = None
+    file_writer = None
 
     try:
-        with os.fdopen(temp_json_fd, "w") as temp_json_file:
-            json.dump(conversation_json, temp_json_file)
+        # Trims, spaces and levels turns, if enabled; chunks are then raw PCM
+        assembler = assembler_from_settings(settings)
+        # Request audio from TTS that needs the least re-encoding downstream
+        audio_plan = plan_audio(
+            output_format, supported_stream_type, pcm=assembler is not None
+        )
+
+        # One encoder per task turns all chunks into a single continuous stream
+        def on_data(data):
+            audio_tasks.append_chunk(task_id, data)
+
+        if audio_plan.stream_passthrough:
+            stream_encoder = PassthroughStream(on_data)
+        else:
+            stream_encoder = StreamEncoder(supported_stream_type, on_data=on_data)
+
+        # The output file is built as chunks arrive, so it is ready right
+        # after the last one
+        file_writer = audio_file_writer(
+            output_file_path,
+            format=output_format,
+            passthrough=audio_plan.file_passthrough,
+        )
 
-        for i, chunk in enumerate(
+        for i, (voice, chunk) in enumerate(
             generate_podcast_audio(
-                temp_json_path, settings=settings, format=output_format
+                conversation_json,
+                settings=settings,
+                format=audio_plan.synthesis_format,
+                on_progress=progress_reporter(task_id, started_at),
+                with_voice=True,
             )
         ):
-            temp_audio_file = os.path.join(temp_dir, f"chunk_{i}.{output_format.value}")
-            with open(temp_audio_file, "wb") as f:
-                f.write(chunk)
-            audio_files.append(temp_audio_file)  # Add file path to the list
-            supported_type_chunk = get_supported_stream(
-                temp_audio_file,
-                supported_stream_type=supported_stream_type,
-                is_first_chunk=i == 0,
-            )
-            audio_queue.put(supported_type_chunk)  # Put the audio chunk into the queue
-            print(f"Generated chunk {i+1} / {len(audio_files)}")
-
-        # Combine audio files after all chunks are generated
-        output_file_path = audio_tasks[task_id]["file_path"]
-        combine_audio_files(audio_files, output_file_path, format=output_format)
-
-        # Signal the end of the stream using the sentinel object
-        audio_queue.put(END_OF_STREAM_SENTINEL)
-        audio_tasks[task_id]["status"] = "completed"
+            # Decode at most once, for whichever side doesn't take the chunk as is
+            pcm = None
+            if assembler is not None:
+                pcm = assembler.add(voice, decode_to_pcm(chunk))
+            elif not (audio_plan.file_passthrough and audio_plan.stream_passthrough):
+                pcm = decode_to_pcm(chunk)
+
+            if audio_plan.file_passthrough:
+                file_writer.append(chunk)
+            else:
+                file_writer.write_pcm(pcm)
+            if audio_plan.stream_passthrough:
+                stream_encoder.append(chunk)
+            else:
+                stream_encoder.write_pcm(pcm)
+            print(f"Generated chunk {i+1}")
+
+        if assembler is not None:
+            chunk = assembler.close()
+            file_writer.write_pcm(chunk)
+            stream_encoder.write_pcm(chunk)
+
+        # Flush the tail of the stream before signalling the end of it
+        stream_encoder.close()
+        stream_encoder = None
+
+        # Finalize the output file (e.g. the sizes in a WAV header)
+        file_writer.close()
+        file_writer = None
+
+        # Signal the end of the stream
+        audio_tasks.append_chunk(task_id, None)
+        audio_tasks.update(task_id, status="completed")
 
     except Exception as e:
         print(f"Audio generation failed for task {task_id}: {str(e)}")
-        audio_tasks[task_id]["status"] = f"failed: {str(e)}"
+        if stream_encoder is not None:
+            stream_encoder.abort()
+        if file_writer is not None:
+            file_writer.abort()
+        # Don't leave a partial file behind
+        if os.path.exists(output_file_path):
+            os.remove(output_file_path)
+        audio_tasks.update(task_id, status=f"failed: {str(e)}")
         # Signal the end of the stream in case of an error
-        audio_queue.put(END_OF_STREAM_SENTINEL)
+        audio_tasks.append_chunk(task_id, None)
 
     finally:
-        # Cleanup temporary files
-        for file in audio_files:
-            if os.path.exists(file):
-                os.remove(file)
-        shutil.rmtree(temp_dir, ignore_errors=True)
-        if os.path.exists(temp_json_path):
-            os.remove(temp_json_path)
-        audio_tasks[task_id]["timestamp"] = time.time()
+        audio_tasks.update(task_id, timestamp=time.time())
 
     print(f"Audio generation for task {task_id} completed.")
 
 
-def stream_audio(task_id):
-    """Streams audio chunks from the queue as they become available."""
-    audio_queue = audio_tasks[task_id]["queue"]
+def progress_reporter(task_id, started_at):
+    """Returns an on_progress callback that records progress in the task's metadata."""
+
+    def on_progress(completed, total):
+        elapsed = time.time() - started_at
+        metadata = {
+            "chunks_completed": completed,
+            "chunks_total": total,
+            "percent": None,
+            "eta_seconds": None,
+        }
+        if total:
+            metadata["percent"] = round(100 * completed / total, 1)
+            metadata["eta_seconds"] = round(
+                elapsed / completed * (total - completed), 1
+            )
+        audio_tasks.update(task_id, metadata=metadata)
+
+    return on_progress
+
+
+def slice_from_offset(chunk, position, offset):
+    """Return the part of `chunk`, which starts at stream byte `position`, from byte `offset` on."""
+    return chunk[max(0, offset - position) :]
+
+
+def stream_audio(task_id, offset=0):
+    """Streams a task's audio from byte `offset`, following its chunk log as it grows."""
     timeout_seconds = 5  # Adjust as needed
+    waiting = False
+    chunk_index = 0  # Next chunk to read from the log
+    position = 0  # Stream byte offset at which that chunk starts
 
     try:
         while True:
             try:
-                audio_tasks[task_id]["waiting"] = False  # Not waiting (initially)
-                chunk = audio_queue.get(timeout=timeout_seconds)
-                if chunk is END_OF_STREAM_SENTINEL:  # End of stream signaled
-                    print("End of stream detected (sentinel object)")
-                    break
-                audio_tasks[task_id]["waiting"] = False  # Not waiting (got a chunk)
-                yield chunk
-
+                chunks = audio_tasks.read_chunks(
+                    task_id, chunk_index, timeout=timeout_seconds
+                )
             except queue.Empty:
                 # No chunk available within the timeout period
                 print("No chunk available, checking task status...")
-                audio_tasks[task_id]["waiting"] = True  # Mark as waiting
-                if audio_tasks[task_id]["status"] == "completed":
-                    print("Audio generation completed, exiting stream loop")
+                task_info = audio_tasks.get(task_id)
+                if task_info is None:
+                    print("Task was removed, exiting stream loop")
                     break
-                elif audio_tasks[task_id]["status"].startswith("failed"):
-                    print(f"Audio generation failed: {audio_tasks[task_id]['status']}")
+                if not waiting:
+                    waiting = True  # Mark as waiting
+                    audio_tasks.update(task_id, waiting=True)
+                if task_info["status"].startswith("failed"):
+                    print(f"Audio generation failed: {task_info['status']}")
                     break
-                else:
-                    print("Audio generation still in progress, continuing to wait...")
-                    # Continue waiting
+                print("Audio generation still in progress, continuing to wait...")
+                continue
+
+            if waiting:
+                waiting = False  # Not waiting (got a chunk)
+                audio_tasks.update(task_id, waiting=False)
+
+            for chunk in chunks:
+                if chunk is None:  # End of stream signaled
+                    print("End of stream detected")
+                    return
+                chunk_index += 1
+                data = slice_from_offset(chunk, position, offset)
+                position += len(chunk)
+                if data:
+                    yield data
 
     finally:
-        if task_id in audio_tasks:
+        if waiting:
             print(f"Cleaning up task in finally: {task_id}")
-            audio_tasks[task_id]["waiting"] = False  # No longer waiting
+            audio_tasks.update(task_id, waiting=False)  # No longer waiting
 
 
 @app.route("/stream/<task_id>")
 def stream(task_id):
+    task_info = audio_tasks.get(task_id)
+    if task_info is None:
+        return jsonify({"error": "Task not found"}), 404
+
+    # Reconnecting listeners pass the number of bytes they already received
+    offset = request.args.get("offset", 0, type=int)
+
+    return Response(
+        stream_with_context(stream_audio(task_id, offset)),
+        mimetype=task_info["stream_type"],
+    )
+
+
+def get_audio_url(task_info):
+    """URL of the saved audio file, once the task has completed."""
+    if task_info["status"] != "completed":
+        return None
+    return f"/static/output/{os.path.basename(task_info['file_path'])}"
+
+
+def task_events(task_info, last_sent):
+    """
+    Returns the (event, data) pairs describing what changed in `task_info`
+    since `last_sent`, and records them in `last_sent`.
+    """
+    events = []
+    metadata = task_info["metadata"]
+    if metadata and metadata != last_sent.get("metadata"):
+        events.append(("progress", metadata))
+        last_sent["metadata"] = metadata
+
+    status = task_info["status"]
+    if status != last_sent.get("status"):
+        if status == "completed":
+            data = {"status": status, "audio_url": get_audio_url(task_info)}
+            if "conversation" in task_info:
+                data["conversation"] = task_info["conversation"]
+            events.append(("completed", data))
+        elif status.startswith("failed"):
+            events.append(("failed", {"status": status}))
+        else:
+            events.append(("status", {"status": status}))
+        last_sent["status"] = status
+
+    return events
+
+
+def format_sse(event, data):
+    """Formats a server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream_task_events(task_id):
+    """Pushes progress, completion and failure events for a task as they happen."""
+    changed = threading.Event()
+
+    def on_change(changed_task_id):
+        if changed_task_id == task_id:
+            changed.set()
+
+    audio_tasks.add_listener(on_change)
+    last_sent = {}
+    last_write = time.monotonic()
+
+    try:
+        while True:
+            changed.clear()
+            task_info = audio_tasks.get(task_id)
+            if task_info is None:
+                yield format_sse("failed", {"status": "failed: task not found"})
+                return
+
+            for event, data in task_events(task_info, last_sent):
+                yield format_sse(event, data)
+                last_write = time.monotonic()
+                if event in ("completed", "failed"):
+                    return
+
+            if not changed.wait(EVENTS_POLL_SECONDS):
+                if time.monotonic() - last_write >= EVENTS_KEEPALIVE_SECONDS:
+                    yield ": keep-alive\n\n"
+                    last_write = time.monotonic()
+    finally:
+        audio_tasks.remove_listener(on_change)
+
+
+@app.route("/events/<task_id>")
+def events(task_id):
     if task_id not in audio_tasks:
         return jsonify({"error": "Task not found"}), 404
 
     return Response(
-        stream_with_context(stream_audio(task_id)), mimetype="audio/mpeg"
-    )  # Assuming MP3 output
+        stream_with_context(stream_task_events(task_id)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.route("/task_status/<task_id>")
 def task_status(task_id):
-    if task_id in audio_tasks:
-        task_info = audio_tasks[task_id]
-        file_path = task_info["file_path"]
-        audio_url = None
-
-        if task_info["status"] == "completed":
-            # Generate the URL for the saved audio file
-            audio_url = f"/static/output/{os.path.basename(file_path)}"
+    task_info = audio_tasks.get(task_id)
+    if task_info is not None:
+        audio_url = get_audio_url(task_info)
+
+        # Each process has its own audio queue. A task queued by another
+        # process reports the position it was queued at.
+        queue_position = audio_executor.position(task_id)
+        queue_depth = audio_executor.depth()
+        if queue_position is None and task_info["status"] == "pending":
+            queue_position = task_info.get("queue_position")
+            queue_depth = task_info.get("queue_depth", queue_depth)
 
         return jsonify(
             {
@@ -263,6 +535,8 @@ def task_status(task_id):
                 "status": task_info["status"],
                 "metadata": task_info["metadata"],
                 "waiting": task_info["waiting"],
+                "queue_position": queue_position,  # 0 = running
+                "queue_depth": queue_depth,
                 "audio_url": audio_url,  # Add audio URL if completed
             }
         )
@@ -270,11 +544,16 @@ def task_status(task_id):
         return jsonify({"error": "Task not found"}), 404
 
 
+@app.route("/cache_stats")
+def cache_stats():
+    return jsonify(cache_stats_snapshot())
+
+
 @app.route("/ack_task/<task_id>", methods=["POST"])
 def ack_task(task_id):
     if task_id in audio_tasks:
         print(f"Received acknowledgment for task: {task_id}")
-        del audio_tasks[task_id]
+        audio_tasks.delete(task_id)
         return jsonify({"success": True})
     else:
         return jsonify({"error": "Task not found"}), 404
@@ -0,0 +1,277 @@
+"""
+ASGI entry point.
+
+Audio streams and progress events are served on asyncio, so an idle
+listener costs a suspended coroutine instead of a WSGI thread, and it is
+woken as soon as the task store reports a new chunk or a status change.
+Every other route is handed to the Flask app on a thread pool.
+
+Run with:
+
+    uvicorn asgi:application --port 5000
+"""
+
+import asyncio
+import json
+import queue
+import time
+from urllib.parse import parse_qs
+from a2wsgi import WSGIMiddleware
+from app import (
+    app as flask_app,
+    audio_tasks,
+    slice_from_offset,
+    task_events,
+    format_sse,
+    EVENTS_KEEPALIVE_SECONDS,
+)
+
+# Fallback re-check interval for changes made by other worker processes,
+# which do not trigger local listeners. An in-memory store only needs a
+# rare safety re-check.
+STREAM_POLL_SECONDS = 1.0 if audio_tasks.shared else 30.0
+
+wsgi_application = WSGIMiddleware(flask_app, workers=10)
+
+
+class TaskNotifier:
+    """Wakes coroutines waiting on a task when the task store reports activity."""
+
+    def __init__(self, loop):
+        self._loop = loop
+        self._events = {}  # task_id -> set of asyncio.Event
+
+    def watch(self, task_id):
+        event = asyncio.Event()
+        self._events.setdefault(task_id, set()).add(event)
+        return event
+
+    def unwatch(self, task_id, event):
+        events = self._events.get(task_id)
+        if events is not None:
+            events.discard(event)
+            if not events:
+                del self._events[task_id]
+
+    def notify(self, task_id):
+        """Thread-safe; called by the task store from generation threads."""
+        self._loop.call_soon_threadsafe(self._wake, task_id)
+
+    def _wake(self, task_id):
+        for event in self._events.get(task_id, ()):
+            event.set()
+
+
+notifier = None
+
+
+async def call_store(fn, *args, **kwargs):
+    """Call the task store, off the event loop if the call may block on I/O."""
+    if audio_tasks.shared:
+        return await asyncio.to_thread(fn, *args, **kwargs)
+    return fn(*args, **kwargs)
+
+
+def get_notifier():
+    global notifier
+    if notifier is None:
+        notifier = TaskNotifier(asyncio.get_running_loop())
+        audio_tasks.add_listener(notifier.notify)
+    return notifier
+
+
+async def send_json(send, status, data):
+    body = json.dumps(data).encode()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json")],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+async def stream(scope, receive, send):
+    """Streams a task's audio log, waking on store events instead of polling."""
+    task_id = scope["path"][len("/stream/") :]
+    task_info = await call_store(audio_tasks.get, task_id)
+    if task_info is None:
+        await send_json(send, 404, {"error": "Task not found"})
+        return
+
+    # Reconnecting listeners pass the number of bytes they already received
+    query = parse_qs(scope.get("query_string", b"").decode())
+    try:
+        offset = int(query.get("offset", ["0"])[0])
+    except ValueError:
+        offset = 0
+
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", task_info["stream_type"].encode())],
+        }
+    )
+
+    task_notifier = get_notifier()
+    event = task_notifier.watch(task_id)
+    disconnected = asyncio.Event()
+
+    async def watch_disconnect():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        disconnected.set()
+        event.set()
+
+    disconnect_watcher = asyncio.create_task(watch_disconnect())
+    waiting = False
+    chunk_index = 0  # Next chunk to read from the log
+    position = 0  # Stream byte offset at which that chunk starts
+    ended = False
+
+    try:
+        while not ended and not disconnected.is_set():
+            event.clear()
+            try:
+                chunks = await call_store(
+                    audio_tasks.read_chunks, task_id, chunk_index, 0
+                )
+            except queue.Empty:
+                task_info = await call_store(audio_tasks.get, task_id)
+                if task_info is None:
+                    break
+                elif task_info["status"].startswith("failed"):
+                    print(f"Audio generation failed: {task_info['status']}")
+                    break
+                if not waiting:
+                    waiting = True
+                    await call_store(audio_tasks.update, task_id, waiting=True)
+                try:
+                    await asyncio.wait_for(event.wait(), STREAM_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            if waiting:
+                waiting = False
+                await call_store(audio_tasks.update, task_id, waiting=False)
+
+            for chunk in chunks:
+                if chunk is None:  # End of stream signaled
+                    ended = True
+                    break
+                chunk_index += 1
+                data = slice_from_offset(chunk, position, offset)
+                position += len(chunk)
+                if data:
+                    await send(
+                        {"type": "http.response.body", "body": data, "more_body": True}
+                    )
+
+        if not disconnected.is_set():
+            await send({"type": "http.response.body", "body": b""})
+    finally:
+        task_notifier.unwatch(task_id, event)
+        disconnect_watcher.cancel()
+        if waiting:
+            await call_store(audio_tasks.update, task_id, waiting=False)
+
+
+async def events(scope, receive, send):
+    """Pushes progress, completion and failure events for a task as they happen."""
+    task_id = scope["path"][len("/events/") :]
+    if await call_store(audio_tasks.get, task_id) is None:
+        await send_json(send, 404, {"error": "Task not found"})
+        return
+
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"),
+            ],
+        }
+    )
+
+    task_notifier = get_notifier()
+    event = task_notifier.watch(task_id)
+    disconnected = asyncio.Event()
+
+    async def watch_disconnect():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        disconnected.set()
+        event.set()
+
+    disconnect_watcher = asyncio.create_task(watch_disconnect())
+    last_sent = {}
+    last_write = time.monotonic()
+    finished = False
+
+    try:
+        while not finished and not disconnected.is_set():
+            event.clear()
+            task_info = await call_store(audio_tasks.get, task_id)
+            if task_info is None:
+                messages = [format_sse("failed", {"status": "failed: task not found"})]
+                finished = True
+            else:
+                messages = []
+                for name, data in task_events(task_info, last_sent):
+                    messages.append(format_sse(name, data))
+                    finished = finished or name in ("completed", "failed")
+
+            if messages:
+                body = "".join(messages).encode()
+                await send(
+                    {"type": "http.response.body", "body": body, "more_body": True}
+                )
+                last_write = time.monotonic()
+            elif not finished:
+                try:
+                    await asyncio.wait_for(
+                        event.wait(), min(STREAM_POLL_SECONDS, EVENTS_KEEPALIVE_SECONDS)
+                    )
+                except asyncio.TimeoutError:
+                    if time.monotonic() - last_write >= EVENTS_KEEPALIVE_SECONDS:
+                        await send(
+                            {
+                                "type": "http.response.body",
+                                "body": b": keep-alive\n\n",
+                                "more_body": True,
+                            }
+                        )
+                        last_write = time.monotonic()
+
+        if not disconnected.is_set():
+            await send({"type": "http.response.body", "body": b""})
+    finally:
+        task_notifier.unwatch(task_id, event)
+        disconnect_watcher.cancel()
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            get_notifier()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+    elif scope["type"] == "http" and scope["path"].startswith("/stream/"):
+        await stream(scope, receive, send)
+    elif scope["type"] == "http" and scope["path"].startswith("/events/"):
+        await events(scope, receive, send)
+    else:
+        await wsgi_application(scope, receive, send)
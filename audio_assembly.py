@@ -0,0 +1,162 @@
+import numpy as np
+from generate_podcast_audio import speaker_voices
+from google_tts import channel_count, sample_rate_hertz
+
+# Frames of this length whose RMS is below SILENCE_THRESHOLD_DB count as
+# silence when trimming the ends of a segment
+FRAME_MS = 10
+SILENCE_THRESHOLD_DB = -50
+# Silence left at each end of a trimmed segment, so words are not clipped
+# and pieces of one turn keep a short natural pause between them
+TRIM_PADDING_MS = 40
+
+# Loudness each voice is normalized to, as the RMS of its voiced frames
+TARGET_LOUDNESS_DB = -20
+MAX_GAIN_DB = 12
+
+FULL_SCALE = 32768
+# Highest sample value after normalization, so that no sample clips
+MAX_PEAK = (FULL_SCALE - 1) / FULL_SCALE
+
+
+def db_to_amplitude(db):
+    return 10 ** (db / 20)
+
+
+class TurnAssembler:
+    """
+    Joins the PCM segments of a podcast into tight, evenly loud audio.
+
+    Each segment (16-bit PCM of one TTS response) is processed in one
+    vectorized pass over a NumPy array: leading and trailing silence is
+    trimmed by the RMS of short frames, the segment is scaled towards
+    TARGET_LOUDNESS_DB by a gain kept per voice (lowered where the segment's
+    peak would clip), and when the voice changes from the previous segment,
+    `gap_ms` of silence is inserted or, with `crossfade_ms`, the two turns
+    overlap with a linear crossfade.
+
+    Gains are based on all voiced audio of a voice so far, so a voice's
+    level settles after its first segments instead of pumping from one
+    segment to the next. With a crossfade, the end of each segment is held
+    back until the next one arrives; close returns it.
+
+    Multi-speaker responses hold both speakers under one voice, so there is
+    no turn change to space or crossfade between them, and loudness is
+    leveled for the conversation as a whole rather than per speaker.
+    """
+
+    def __init__(
+        self,
+        trim=True,
+        gap_ms=0,
+        crossfade_ms=0,
+        normalize=True,
+        sample_rate=sample_rate_hertz,
+        channel_count=channel_count,
+    ):
+        self.trim = trim
+        self.normalize = normalize
+        self.channel_count = channel_count
+        self.frame_length = sample_rate * FRAME_MS // 1000
+        self.padding = sample_rate * TRIM_PADDING_MS // 1000
+        self.gap = sample_rate * int(gap_ms) // 1000
+        self.crossfade = sample_rate * int(crossfade_ms) // 1000
+        self._voice = None
+        self._tail = np.zeros((0, channel_count), dtype=np.float32)
+        self._loudness = {}  # voice -> (sum of voiced frame energies, frame count)
+
+    def add(self, voice, pcm):
+        """Process a segment of `voice`, returning the PCM that is ready to play."""
+        # Only whole frames; a stray trailing byte would not fit in an int16
+        frame_bytes = 2 * self.channel_count
+        pcm = pcm[: len(pcm) - len(pcm) % frame_bytes]
+        samples = np.frombuffer(pcm, dtype="<i2")
+        samples = samples.reshape(-1, self.channel_count).astype(np.float32)
+        samples /= FULL_SCALE
+
+        rms = self.frame_rms(samples)
+        voiced = rms > db_to_amplitude(SILENCE_THRESHOLD_DB)
+        if self.trim:
+            if not voiced.any():
+                return b""  # Nothing but silence
+            frames = np.flatnonzero(voiced)
+            start = max(0, frames[0] * self.frame_length - self.padding)
+            end = min(len(samples), (frames[-1] + 1) * self.frame_length + self.padding)
+            samples = samples[start:end]
+
+        # Silence is kept as it is and doesn't count towards the voice's loudness
+        if self.normalize and voiced.any():
+            samples *= self.gain(voice, rms[voiced], np.max(np.abs(samples)))
+
+        turn_change = self._voice is not None and voice != self._voice
+        self._voice = voice
+        tail = self._tail
+        if turn_change and self.crossfade:
+            overlap = min(len(tail), len(samples), self.crossfade)
+            fade_in = np.linspace(0, 1, overlap, dtype=np.float32)[:, None]
+            samples[:overlap] *= fade_in
+            samples[:overlap] += tail[len(tail) - overlap :] * (1 - fade_in)
+            tail = tail[: len(tail) - overlap]
+        elif turn_change and self.gap:
+            tail = np.concatenate(
+                [tail, np.zeros((self.gap, self.channel_count), dtype=np.float32)]
+            )
+
+        # Hold back the end of the segment for a crossfade into the next turn
+        held = min(len(samples), self.crossfade)
+        self._tail = samples[len(samples) - held :]
+        return self.to_pcm(np.concatenate([tail, samples[: len(samples) - held]]))
+
+    def close(self):
+        """Return the PCM still held back for a crossfade."""
+        tail = self._tail
+        self._tail = tail[:0]
+        return self.to_pcm(tail)
+
+    def frame_rms(self, samples):
+        """RMS of each frame of `samples` across all channels, the last frame zero-padded."""
+        padding = -len(samples) % self.frame_length
+        frames = np.pad(samples, ((0, padding), (0, 0))).reshape(
+            -1, self.frame_length * self.channel_count
+        )
+        return np.sqrt(np.mean(np.square(frames), axis=1))
+
+    def gain(self, voice, voiced_rms, peak):
+        """
+        Gain bringing `voice` to the target loudness, including this segment's
+        frames, but no higher than keeps the segment's `peak` from clipping.
+        """
+        energy, count = self._loudness.get(voice, (0.0, 0))
+        energy += float(np.sum(np.square(voiced_rms)))
+        count += len(voiced_rms)
+        self._loudness[voice] = (energy, count)
+
+        loudness = np.sqrt(energy / count)
+        max_gain = db_to_amplitude(MAX_GAIN_DB)
+        gain = np.clip(db_to_amplitude(TARGET_LOUDNESS_DB) / loudness, 1 / max_gain, max_gain)
+        return np.float32(min(gain, MAX_PEAK / peak))
+
+    def to_pcm(self, samples):
+        samples = np.rint(samples * FULL_SCALE)
+        return np.clip(samples, -FULL_SCALE, FULL_SCALE - 1).astype("<i2").tobytes()
+
+
+def assembler_from_settings(settings):
+    """
+    Return a TurnAssembler for the audio settings "trimSilence",
+    "normalizeLoudness", "turnGap" and "crossfade" (milliseconds), or None
+    if none of them is set. "turnGap" and "crossfade" are ignored for
+    multi-speaker voices, whose turns are not returned separately.
+    """
+    trim = bool(settings.get("trimSilence", False))
+    normalize = bool(settings.get("normalizeLoudness", False))
+    gap_ms = int(settings.get("turnGap") or 0)
+    crossfade_ms = int(settings.get("crossfade") or 0)
+    if (gap_ms or crossfade_ms) and speaker_voices(settings)[2]:
+        print("Ignoring turnGap and crossfade: multi-speaker turns are not separate")
+        gap_ms = crossfade_ms = 0
+    if not (trim or normalize or gap_ms or crossfade_ms):
+        return None
+    return TurnAssembler(
+        trim=trim, gap_ms=gap_ms, crossfade_ms=crossfade_ms, normalize=normalize
+    )
@@ -0,0 +1,243 @@
+import re
+from collections import deque
+from html import escape
+from emotion import apply_emotional_ssml
+
+# The TTS API rejects synthesis input larger than this many bytes
+TTS_REQUEST_BYTE_LIMIT = 5000
+
+# Startup schedule: the first request is small so playback starts quickly,
+# and each following one may be `CHUNK_GROWTH` times larger
+FIRST_CHUNK_BYTES = 300
+CHUNK_GROWTH = 2
+
+# Voice types that only accept plain text, not SSML
+PLAIN_TEXT_VOICE_TYPES = ("Journey", "Chirp")
+
+# Whitespace after the end of a sentence, and after a clause
+SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+|(?<=[.!?][\"')\]])\s+")
+CLAUSE_BREAK = re.compile(r"(?<=[,;:])\s+|\s+(?=[—–-]\s)")
+
+
+def varint_size(value):
+    """Bytes taken by `value` encoded as a protobuf varint."""
+    size = 1
+    while value >= 0x80:
+        value >>= 7
+        size += 1
+    return size
+
+
+def field_size(payload_size):
+    """
+    Bytes taken by a length-delimited protobuf field with a number below 16,
+    like every field of SynthesisInput and MultiSpeakerMarkup.Turn.
+    """
+    return 1 + varint_size(payload_size) + payload_size
+
+
+def supports_ssml(voice):
+    """Whether `voice` (a voice name) accepts SSML input."""
+    return not any(f"-{voice_type}" in voice for voice_type in PLAIN_TEXT_VOICE_TYPES)
+
+
+def to_emotional_ssml(text):
+    """Render plain text as SSML with emotional prosody."""
+    return apply_emotional_ssml(escape(text, quote=False))
+
+
+class ChunkPlanner:
+    """
+    Packs conversation turns into TTS requests by their serialized size.
+
+    Sizes are measured in bytes of the encoded SynthesisInput, the same
+    message synthesize_input sends, so UTF-8 text, SSML markup and the
+    multi-speaker turn framing are all counted. Multi-speaker chunks hold
+    as many turns as fit under the chunk's limit; otherwise every entry is
+    its own request. With `render`, entry text is converted (e.g. to SSML
+    by to_emotional_ssml) before it is measured, and sent as SSML, for
+    voices that accept SSML; others get plain text.
+
+    Chunk limits start at `first_chunk_bytes` and grow by `growth` per
+    chunk up to `byte_limit`, so the first audio comes back after one short
+    request while later chunks are packed full to keep the request count
+    low.
+
+    Entries are {"text": ..., "speaker": voice name}, plus "ssml": True
+    when the text is SSML.
+    """
+
+    def __init__(
+        self,
+        multi_speaker=False,
+        byte_limit=TTS_REQUEST_BYTE_LIMIT,
+        render=None,
+        first_chunk_bytes=FIRST_CHUNK_BYTES,
+        growth=CHUNK_GROWTH,
+    ):
+        self.multi_speaker = multi_speaker
+        self.byte_limit = byte_limit
+        self.first_chunk_bytes = first_chunk_bytes
+        self.growth = growth
+        self.render = None if multi_speaker else render  # Markup has no SSML
+
+    def entry_size(self, entry):
+        """Bytes `entry` adds to a request."""
+        text_size = len(entry["text"].encode("utf-8"))
+        if not self.multi_speaker:
+            return field_size(text_size)
+        # A MultiSpeakerMarkup.Turn of speaker (field 1) and text (field 2)
+        speaker = entry["speaker"].split("-")[-1]
+        return field_size(
+            field_size(len(speaker.encode("utf-8"))) + field_size(text_size)
+        )
+
+    def request_size(self, entries):
+        """Bytes of the SynthesisInput for one chunk of entries."""
+        if not self.multi_speaker:
+            return sum(self.entry_size(entry) for entry in entries)
+        return field_size(sum(self.entry_size(entry) for entry in entries))
+
+    def chunk_limit(self, index):
+        """Byte limit for the `index`-th chunk (0-based) of the startup schedule."""
+        return min(self.byte_limit, int(self.first_chunk_bytes * self.growth**index))
+
+    def plan(self, turns, host_voice, guest_voice):
+        """
+        Lazily yield chunks (lists of entries) for conversation turns
+        ({"speaker": "Host" | "Guest", "text": ...}), each chunk as soon as
+        it is full, so `turns` may still be in production.
+        """
+        chunk = []
+        chunk_size = 0
+        chunk_count = 0
+
+        for turn in turns:
+            voice = host_voice if turn["speaker"] == "Host" else guest_voice
+            pending = deque([turn["text"]])
+            while pending:
+                limit = self.chunk_limit(chunk_count)
+                piece = pending.popleft()
+                entry = self.make_entry(piece, voice)
+                size = self.entry_size(entry)
+
+                if chunk and self.request_size_for(chunk_size + size) > limit:
+                    # Start a new chunk and try the piece again in it
+                    yield chunk
+                    chunk = []
+                    chunk_size = 0
+                    chunk_count += 1
+                    pending.appendleft(piece)
+                    continue
+
+                request_size = self.request_size_for(size)
+                if request_size > limit:
+                    pieces = self.split(piece, voice, limit, request_size)
+                    if pieces is not None:
+                        if limit < self.byte_limit and pending:
+                            # Keep the rest of the turn whole for larger chunks
+                            pieces[-1] += " " + pending.popleft()
+                        pending.extendleft(reversed(pieces))
+                        continue
+                    if request_size > self.byte_limit:
+                        raise ValueError("Text cannot be split to fit a TTS request")
+                    # An unsplittable piece may use the full limit early
+
+                chunk.append(entry)
+                chunk_size += size
+                if not self.multi_speaker:
+                    yield chunk  # Every entry is its own request
+                    chunk = []
+                    chunk_size = 0
+                    chunk_count += 1
+
+        if chunk:
+            yield chunk
+
+    def request_size_for(self, entries_size):
+        """Bytes of a request whose entries take `entries_size` bytes."""
+        return field_size(entries_size) if self.multi_speaker else entries_size
+
+    def split(self, piece, voice, limit, request_size):
+        """
+        Split text whose request would take `request_size` bytes so its
+        first part fits in `limit`, or return None if it cannot be split.
+        """
+        # Requests grow roughly linearly with the text, from the size of an
+        # empty one; markup added by render makes the slope steeper
+        empty_size = self.request_size([self.make_entry("", voice)])
+        text_size = len(piece.encode("utf-8"))
+        budget = text_size * (limit - empty_size) // (request_size - empty_size)
+        budget = max(1, budget)
+        if limit < self.byte_limit:
+            # Later chunks are larger, so only a full-size head is cut off
+            pieces = split_text(piece, budget, balanced=False)
+            pieces[1:] = [" ".join(pieces[1:])] if len(pieces) > 1 else []
+        else:
+            pieces = split_text(piece, budget)
+        return pieces if len(pieces) > 1 else None
+
+    def make_entry(self, text, voice):
+        if self.render is None or not supports_ssml(voice):
+            return {"text": text, "speaker": voice}
+        return {"text": self.render(text), "speaker": voice, "ssml": True}
+
+
+def split_text(text, max_bytes, balanced=True):
+    """
+    Split `text` into balanced pieces of at most `max_bytes` UTF-8 bytes.
+
+    Pieces break between sentences where possible, then between clauses,
+    and only then between words. Instead of filling each piece to the limit
+    and leaving a short tail, every piece aims at an equal share of what is
+    left, unless `balanced` is False. Runs in time linear in the length of
+    the text.
+    """
+    units = [
+        (unit, len(unit.encode("utf-8")))
+        for unit in split_units(text, max_bytes, (SENTENCE_BREAK, CLAUSE_BREAK))
+    ]
+    remaining = sum(size for _, size in units) + max(0, len(units) - 1)
+
+    pieces = []
+    piece = []
+    piece_size = 0
+    target = remaining / -(-remaining // max_bytes) if remaining else 0
+    if not balanced:
+        target = max_bytes
+    for unit, size in units:
+        joined_size = piece_size + 1 + size if piece else size
+        # Close the piece before this unit if the unit would overflow it, or
+        # would take it further past the target than stopping short of it
+        if piece and (
+            joined_size > max_bytes
+            or (joined_size > target and joined_size - target > target - piece_size)
+        ):
+            pieces.append(" ".join(piece))
+            remaining -= piece_size + 1
+            if balanced:
+                target = remaining / -(-remaining // max_bytes)
+            piece = []
+            joined_size = size
+        piece.append(unit)
+        piece_size = joined_size
+    if piece:
+        pieces.append(" ".join(piece))
+    return pieces
+
+
+def split_units(text, max_bytes, breaks):
+    """
+    Yield the parts of `text` between the first of `breaks` (regexes), with
+    parts still longer than `max_bytes` split by the next ones, and finally
+    into words.
+    """
+    if not breaks:
+        yield from text.split()
+        return
+    for part in breaks[0].split(text):
+        part = part.strip()
+        if len(part.encode("utf-8")) > max_bytes:
+            yield from split_units(part, max_bytes, breaks[1:])
+        elif part:
+            yield part
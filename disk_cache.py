@@ -0,0 +1,266 @@
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+
+class DiskLRUCache:
+    """
+    Byte-budgeted, disk-backed key/value cache with LRU eviction.
+
+    Values are stored one file per key. The LRU order and sizes are kept in
+    memory and rebuilt from file modification times on startup, so the cache
+    survives restarts. Writes go through a temporary file and os.replace, so
+    readers never see a partially written entry.
+
+    With `max_age` (seconds), entries not used for that long are removed by
+    prune, which start_pruning runs periodically on a background thread.
+
+    Several processes may share the directory. Entries written by another
+    process are picked up when first read, and the index is rebuilt from
+    the directory at most every `sync_interval` seconds when writing, so
+    the budget covers what every process has stored.
+    """
+
+    def __init__(
+        self, directory, max_bytes, suffix=".bin", max_age=None, sync_interval=60
+    ):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.max_age = max_age
+        self.sync_interval = sync_interval
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # key -> (size in bytes, last used as a Unix time), oldest first
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._pruner = None
+        self._synced_at = 0
+
+        if self.enabled:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._load_index()
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def get(self, key):
+        """Return the cached bytes for `key`, or None on a miss."""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            known = key in self._entries
+            if known:
+                self._entries.move_to_end(key)
+                self._entries[key] = (self._entries[key][0], time.time())
+
+        # Unknown keys are still looked up, as another process may have
+        # stored them
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = f.read()
+            # Persist the recency so LRU order survives a restart
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._forget(key)
+                self.misses += 1
+            return None
+
+        with self._lock:
+            if not known:
+                self._forget(key)
+                self._entries[key] = (len(value), time.time())
+                self._total_bytes += len(value)
+                self._evict()
+            self.hits += 1
+        return value
+
+    def set(self, key, value):
+        """Store `value` (bytes) under `key`, evicting old entries if needed."""
+        if not self.enabled or len(value) > self.max_bytes:
+            return
+
+        temp_path = None
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(value)
+            os.replace(temp_path, self._path(key))
+        except Exception as e:
+            print(f"Error saving to cache: {e}")
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+
+        if time.time() - self._synced_at > self.sync_interval:
+            # Also counts what other processes stored since the last sync
+            self._load_index()
+            return
+
+        with self._lock:
+            self._forget(key)
+            self._entries[key] = (len(value), time.time())
+            self._total_bytes += len(value)
+            self._evict()
+
+    def prune(self):
+        """Remove entries unused for longer than `max_age`. Returns how many."""
+        if not self.enabled or self.max_age is None:
+            return 0
+
+        cutoff = time.time() - self.max_age
+        removed = 0
+        with self._lock:
+            # Entries are in LRU order, so the stale ones are at the front
+            while self._entries:
+                key, (size, last_used) = next(iter(self._entries.items()))
+                if last_used >= cutoff:
+                    break
+                self._remove_oldest()
+                removed += 1
+        return removed
+
+    def start_pruning(self, interval):
+        """Run prune every `interval` seconds on a daemon thread."""
+        if self._pruner is not None or self.max_age is None:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.prune()
+                except Exception as e:
+                    print(f"Error pruning cache: {e}")
+
+        self._pruner = threading.Thread(target=run, name="cache-pruner", daemon=True)
+        self._pruner.start()
+
+    def stats(self):
+        """Return hit/miss/eviction counters and current usage."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _path(self, key):
+        return self.directory / f"{key}{self.suffix}"
+
+    def _load_index(self):
+        """(Re)build the index from the files in the directory, oldest first."""
+        files = []
+        for path in self.directory.glob(f"*{self.suffix}"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, path.name[: -len(self.suffix)], stat.st_size))
+
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+            for mtime, key, size in sorted(files):
+                self._entries[key] = (size, mtime)
+                self._total_bytes += size
+            self._synced_at = time.time()
+            self._evict()
+
+    def _forget(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry[0]
+
+    def _evict(self):
+        """Drop least recently used entries until within budget. Caller holds the lock."""
+        while self._total_bytes > self.max_bytes and self._entries:
+            self._remove_oldest()
+
+    def _remove_oldest(self):
+        """Delete the least recently used entry. Caller holds the lock."""
+        key, (size, _) = self._entries.popitem(last=False)
+        self._total_bytes -= size
+        self.evictions += 1
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+class TieredCache:
+    """
+    In-process LRU of decoded values in front of a DiskLRUCache.
+
+    Hot keys are served from memory without touching the filesystem or
+    decoding again; misses fall through to disk and are promoted. `dumps`
+    and `loads` convert between values and the bytes stored on disk. Values
+    returned from memory are shared, so callers must not modify them.
+    """
+
+    def __init__(self, disk, max_memory_entries=128, dumps=bytes, loads=bytes):
+        self.disk = disk
+        self.max_memory_entries = max_memory_entries
+        self.dumps = dumps
+        self.loads = loads
+        self.memory_hits = 0
+        self.memory_evictions = 0
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> value, oldest first
+
+    def get(self, key):
+        """Return the value for `key` from memory or disk, or None on a miss."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return self._memory[key]
+
+        data = self.disk.get(key)
+        if data is None:
+            return None
+        try:
+            value = self.loads(data)
+        except Exception as e:
+            print(f"Error reading cache entry {key}: {e}")
+            return None
+        self._remember(key, value)
+        return value
+
+    def set(self, key, value):
+        """Store `value` in memory and write it through to disk."""
+        self.disk.set(key, self.dumps(value))
+        self._remember(key, value)
+
+    def stats(self):
+        """Return memory tier counters alongside the disk tier's."""
+        with self._lock:
+            memory = {
+                "memory_hits": self.memory_hits,
+                "memory_evictions": self.memory_evictions,
+                "memory_entries": len(self._memory),
+                "max_memory_entries": self.max_memory_entries,
+            }
+        return {**memory, **self.disk.stats()}
+
+    def _remember(self, key, value):
+        if self.max_memory_entries <= 0:
+            return
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+                self.memory_evictions += 1
@@ -1,5 +1,166 @@
 import re
 
+# --- Emotion Keyword Dictionaries ---
+laughter_keywords = ["haha", "hehe", "lol", "chuckle", "giggle", "bwahaha", "lmao"]
+crying_keywords = [
+    "sob",
+    "sniffle",
+    "waaah",
+    "tears",
+    "heartbroken",
+    "devastated",
+    "grief",
+]
+joyful_keywords = [
+    "happy",
+    "joyful",
+    "excited",
+    "thrilled",
+    "delighted",
+    "wonderful",
+    "fantastic",
+]
+angry_keywords = ["angry", "furious", "mad", "irritated", "frustrated", "outraged"]
+serious_keywords = [
+    "serious",
+    "important",
+    "crucial",
+    "essential",
+    "fundamental",
+    "solemn",
+]
+
+
+def apply_prosody(text, pitch=None, rate=None, volume=None):
+    ssml = "<prosody"
+    if pitch:
+        ssml += f' pitch="{pitch}"'
+    if rate:
+        ssml += f' rate="{rate}"'
+    if volume:
+        ssml += f' volume="{volume}"'
+    ssml += f">{text}</prosody>"
+    return ssml
+
+
+# Sentence cues, highest priority first: keywords anywhere in the sentence
+# (matched as substrings, ignoring case), then punctuation
+CUES = [
+    ("laughter", laughter_keywords, {"pitch": "+2st", "rate": "+20%"}),
+    ("crying", crying_keywords, {"pitch": "-2st", "rate": "-15%", "volume": "soft"}),
+    ("joyful", joyful_keywords, {"pitch": "+1.5st", "rate": "+15%"}),
+    ("angry", angry_keywords, {"pitch": "-1st", "rate": "-5%", "volume": "loud"}),
+    ("serious", serious_keywords, {"pitch": "-1st", "rate": "-10%"}),
+    ("exclamation", ["!"], {"pitch": "+1st", "rate": "+10%"}),
+    ("question", ["?"], {"pitch": "+0.5st", "rate": "+5%"}),
+    ("pause", ["..."], {"rate": "-20%"}),
+]
+
+
+def keyword_trie_pattern(keywords):
+    """
+    Regex source matching any of `keywords`, with shared prefixes factored
+    out, so the regex engine tries a few branches per position instead of
+    every keyword.
+    """
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = {}  # End of a keyword
+
+    def build(node):
+        branches = [
+            re.escape(char) + build(child) for char, child in node.items() if char
+        ]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+def keyword_priorities(cues):
+    """
+    Map each keyword to the priority of its cue. A match reports the longest
+    keyword at its position, so a keyword also takes the best priority of
+    any keyword that is a prefix of it.
+    """
+    priorities = {}
+    for priority, (_, keywords, _) in enumerate(cues):
+        for keyword in keywords:
+            priorities.setdefault(keyword, priority)
+    return {
+        keyword: min(
+            p for prefix, p in priorities.items() if keyword.startswith(prefix)
+        )
+        for keyword in priorities
+    }
+
+
+CUE_KEYWORDS = keyword_priorities(CUES)
+# Opening <prosody> tag for each cue, built once
+CUE_TAGS = {
+    name: apply_prosody("", **prosody)[: -len("</prosody>")]
+    for name, _, prosody in CUES
+}
+
+# Matched against lowercased sentences. The lookahead variant matches at
+# every position where a keyword starts, so overlapping keywords are all
+# seen; the plain one quickly finds the first position, if any.
+CUE_SEARCH = re.compile(keyword_trie_pattern(CUE_KEYWORDS))
+CUE_PATTERN = re.compile(f"(?=({CUE_SEARCH.pattern}))")
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+")
+
+# --- Context-Based Emotion (Parentheticals) ---
+CHEERFUL_ASIDE = re.compile(keyword_trie_pattern(laughter_keywords + ["warm smile"]))
+SAD_ASIDE = re.compile(
+    keyword_trie_pattern(crying_keywords + ["deep sigh", "shake of the head"])
+)
+
+
+def detect_cue(sentence):
+    """Return the name of the highest-priority cue in `sentence`, or None."""
+    lower_sentence = sentence.lower()
+    first = CUE_SEARCH.search(lower_sentence)
+    if first is None:
+        return None
+
+    best = len(CUES)
+    for match in CUE_PATTERN.finditer(lower_sentence, first.start()):
+        best = min(best, CUE_KEYWORDS[match.group(1)])
+        if best == 0:
+            break
+    return CUES[best][0]
+
+
+def tag_sentence(sentence):
+    """SSML for one sentence, or None if it is dropped."""
+    cue = detect_cue(sentence)
+    if cue == "pause":
+        # Reduced rate and added break for dramatic pause
+        return (
+            f'{CUE_TAGS[cue]}{sentence.replace("...", "")}</prosody><break time="1s"/>'
+        )
+    if cue is not None:
+        return f"{CUE_TAGS[cue]}{sentence}</prosody>"
+
+    if "(" in sentence and ")" in sentence:
+        # Assuming parentheticals often indicate tone or action
+        content_in_parenthesis = sentence[sentence.find("(") + 1 : sentence.find(")")]
+        # Apply to the sentence not just the parenthesis
+        without_aside = sentence.replace(f"({content_in_parenthesis})", "")
+        lower_aside = content_in_parenthesis.lower()
+        if CHEERFUL_ASIDE.search(lower_aside):
+            return apply_prosody(without_aside, pitch="+1st", rate="+10%")
+        if SAD_ASIDE.search(lower_aside):
+            return apply_prosody(without_aside, pitch="-2st", rate="-10%")
+        return None
+
+    return sentence
+
 
 def apply_emotional_ssml(text):
     """
@@ -12,121 +173,23 @@ def apply_emotional_ssml(text):
     Returns:
         The text with SSML tags for emotional cues.
     """
+    ssml_parts = ["<speak>"]
+    for sentence in SENTENCE_BOUNDARY.split(text):
+        tagged = tag_sentence(sentence)
+        if tagged is not None:
+            ssml_parts.append(tagged + " ")
+    ssml_parts.append("</speak>")
+    return "".join(ssml_parts)
+
+
+def apply_emotional_ssml_batch(texts):
+    """
+    Applies emotional cues to many texts, e.g. every turn of a conversation.
 
-    # --- Emotion Keyword Dictionaries ---
-    laughter_keywords = ["haha", "hehe", "lol", "chuckle", "giggle", "bwahaha", "lmao"]
-    crying_keywords = [
-        "sob",
-        "sniffle",
-        "waaah",
-        "tears",
-        "heartbroken",
-        "devastated",
-        "grief",
-    ]
-    joyful_keywords = [
-        "happy",
-        "joyful",
-        "excited",
-        "thrilled",
-        "delighted",
-        "wonderful",
-        "fantastic",
-    ]
-    angry_keywords = ["angry", "furious", "mad", "irritated", "frustrated", "outraged"]
-    serious_keywords = [
-        "serious",
-        "important",
-        "crucial",
-        "essential",
-        "fundamental",
-        "solemn",
-    ]
-
-    # --- Punctuation Patterns ---
-    exclamation_pattern = r"!"
-    question_pattern = r"\?"
-    pause_pattern = r"\.\.\."
-
-    # --- Helper function to apply prosody ---
-    def apply_prosody(text, pitch=None, rate=None, volume=None):
-        ssml = "<prosody"
-        if pitch:
-            ssml += f' pitch="{pitch}"'
-        if rate:
-            ssml += f' rate="{rate}"'
-        if volume:
-            ssml += f' volume="{volume}"'
-        ssml += f">{text}</prosody>"
-        return ssml
-
-    sentences = re.split(
-        r"(?<=[.!?])\s+", text
-    )  # Split into sentences based on punctuation
-    ssml_text = "<speak>"
-
-    for sentence in sentences:
-        lower_sentence = sentence.lower()
-
-        # --- Emotion Detection ---
-        if any(keyword in lower_sentence for keyword in laughter_keywords):
-            ssml_text += apply_prosody(sentence, pitch="+2st", rate="+20%") + " "
-        elif any(keyword in lower_sentence for keyword in crying_keywords):
-            ssml_text += (
-                apply_prosody(sentence, pitch="-2st", rate="-15%", volume="soft") + " "
-            )
-        elif any(keyword in lower_sentence for keyword in joyful_keywords):
-            ssml_text += apply_prosody(sentence, pitch="+1.5st", rate="+15%") + " "
-        elif any(keyword in lower_sentence for keyword in angry_keywords):
-            ssml_text += (
-                apply_prosody(sentence, pitch="-1st", rate="-5%", volume="loud") + " "
-            )
-        elif any(keyword in lower_sentence for keyword in serious_keywords):
-            ssml_text += apply_prosody(sentence, pitch="-1st", rate="-10%") + " "
-        # --- Punctuation-Based Emotion ---
-        elif re.search(exclamation_pattern, sentence):
-            ssml_text += apply_prosody(sentence, pitch="+1st", rate="+10%") + " "
-        elif re.search(question_pattern, sentence):
-            ssml_text += apply_prosody(sentence, pitch="+0.5st", rate="+5%") + " "
-        elif re.search(pause_pattern, sentence):
-            ssml_text += (
-                apply_prosody(sentence.replace("...", ""), rate="-20%")
-                + '<break time="1s"/>'
-                + " "
-            )  # Reduced rate and added break for dramatic pause
-        # --- Context-Based Emotion (Example - Parentheticals)---
-        elif "(" in sentence and ")" in sentence:
-            # Assuming parentheticals often indicate tone or action
-            content_in_parenthesis = sentence[
-                sentence.find("(") + 1 : sentence.find(")")
-            ]
-            if any(
-                keyword in content_in_parenthesis.lower()
-                for keyword in laughter_keywords + ["warm smile"]
-            ):
-                ssml_text += (
-                    apply_prosody(
-                        sentence.replace(f"({content_in_parenthesis})", ""),
-                        pitch="+1st",
-                        rate="+10%",
-                    )
-                    + " "
-                )  # Apply to the sentence not just the parenthesis
-            elif any(
-                keyword in content_in_parenthesis.lower()
-                for keyword in crying_keywords + ["deep sigh", "shake of the head"]
-            ):
-                ssml_text += (
-                    apply_prosody(
-                        sentence.replace(f"({content_in_parenthesis})", ""),
-                        pitch="-2st",
-                        rate="-10%",
-                    )
-                    + " "
-                )
-
-        else:
-            ssml_text += sentence + " "
-
-    ssml_text += "</speak>"
-    return ssml_text
+    Args:
+        texts: An iterable of text strings.
+
+    Returns:
+        A list with the SSML for each text, in order.
+    """
+    return [apply_emotional_ssml(text) for text in texts]
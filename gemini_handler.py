@@ -1,10 +1,13 @@
 import os
 import google.generativeai as genai
 import json
-import re
 import hashlib
 from datetime import datetime, timedelta
 from pathlib import Path
+from disk_cache import DiskLRUCache, TieredCache
+from json_scanner import JsonScanner, parse_json
+from rate_limiter import RateLimiter, RateLimitExceeded, parse_budgets
+from single_flight import FlightCancelled, SingleFlight
 from prompts import (
     SYSTEM_PROMPT,
     ERROR_CORRECTION_PROMPT,
@@ -21,50 +24,56 @@ model = genai.GenerativeModel(GEMINI_MODEL)
 
 # Rate limiting configuration
 RATE_LIMIT_WINDOW = timedelta(hours=1)
-last_request_time = None
-requests_in_window = 0
 MAX_REQUESTS_PER_WINDOW = 60  # Adjust based on your API limits
+# Per-model budgets, e.g. "gemini-1.5-flash=60/3600,gemini-exp-1206=10/60"
+MODEL_RATE_LIMITS = parse_budgets(os.getenv("GEMINI_RATE_LIMITS", ""))
+# Requests over budget wait in line for a token instead of failing outright
+RATE_LIMIT_MAX_WAITERS = int(os.getenv("RATE_LIMIT_MAX_WAITERS", 10))
+# Seconds; by default, as long as one token takes to refill
+RATE_LIMIT_MAX_WAIT = (
+    float(os.environ["RATE_LIMIT_MAX_WAIT"])
+    if os.getenv("RATE_LIMIT_MAX_WAIT")
+    else None
+)
+rate_limiter = RateLimiter(
+    (MAX_REQUESTS_PER_WINDOW, RATE_LIMIT_WINDOW.total_seconds()),
+    MODEL_RATE_LIMITS,
+    max_waiters=RATE_LIMIT_MAX_WAITERS,
+    max_wait=RATE_LIMIT_MAX_WAIT,
+)
 
 # Cache configuration
 CACHE_DIR = Path("cache")
 CACHE_DIR.mkdir(exist_ok=True)
 CACHE_DURATION = timedelta(days=7)  # Cache responses for 7 days
 CACHE_TIME_LIMIT = timedelta(minutes=5)  # Cache time limit
+SCRIPT_CACHE_MAX_BYTES = int(os.getenv("SCRIPT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+SCRIPT_CACHE_MEMORY_ENTRIES = int(os.getenv("SCRIPT_CACHE_MEMORY_ENTRIES", 128))
+CACHE_PRUNE_INTERVAL = 3600  # Seconds between removals of stale files
+
+# Recent scripts are kept parsed in memory, over a size- and age-bounded
+# directory of JSON files
+script_cache = TieredCache(
+    DiskLRUCache(
+        CACHE_DIR,
+        SCRIPT_CACHE_MAX_BYTES,
+        suffix=".json",
+        max_age=CACHE_DURATION.total_seconds(),
+    ),
+    max_memory_entries=SCRIPT_CACHE_MEMORY_ENTRIES,
+    dumps=lambda data: json.dumps(data).encode(),
+    loads=json.loads,
+)
+script_cache.disk.start_pruning(CACHE_PRUNE_INTERVAL)
+
+# Script requests in progress, keyed like the cache
+script_flights = SingleFlight()
 
 
 def extract_json_from_text(text):
     """Extract JSON object from text, handling potential formatting issues."""
     print("Raw response:", text)
-
-    # Try to find JSON object in the text
-    json_match = re.search(r"\{[\s\S]*\}", text)
-    if not json_match:
-        raise ValueError("No JSON object found in the response")
-
-    json_str = json_match.group(0)
-    print("Extracted JSON string:", json_str)
-
-    try:
-        # Try to parse the JSON directly
-        return json.loads(json_str)
-    except json.JSONDecodeError as e:
-        print(f"Initial JSON parsing failed: {e}")
-
-        # Clean up common formatting issues
-        cleaned_json = json_str
-        # Replace single quotes with double quotes
-        cleaned_json = cleaned_json.replace("'", '"')
-        # Fix unquoted keys
-        cleaned_json = re.sub(r"(\w+)(?=\s*:)", r'"\1"', cleaned_json)
-        # Fix trailing commas
-        cleaned_json = re.sub(r",(\s*[}\]])", r"\1", cleaned_json)
-
-        print("Cleaned JSON string:", cleaned_json)
-
-        try:
-            return json.loads(cleaned_json)
-        except json.JSONDecodeError as e:
-            raise ValueError(f"Failed to parse JSON after cleaning: {e}")
+    return parse_json(text)
 
 
 def validate_conversation_json(data):
@@ -94,30 +103,8 @@ def validate_conversation_json(data):
 
 
 def check_rate_limit():
-    """Check if we're within rate limits."""
-    global last_request_time, requests_in_window
-
-    current_time = datetime.now()
-
-    # First request or window expired
-    if (
-        last_request_time is None
-        or current_time - last_request_time > RATE_LIMIT_WINDOW
-    ):
-        last_request_time = current_time
-        requests_in_window = 0
-        return True
-
-    # Check if we're still within limits
-    if requests_in_window >= MAX_REQUESTS_PER_WINDOW:
-        time_until_reset = (
-            last_request_time + RATE_LIMIT_WINDOW - current_time
-        ).total_seconds()
-        raise Exception(
-            f"Rate limit exceeded. Please try again in {int(time_until_reset/60)} minutes."
-        )
-
-    requests_in_window += 1
+    """Take a request token for the model, waiting briefly if the budget is spent."""
+    rate_limiter.acquire(GEMINI_MODEL)
     return True
 
 
@@ -130,15 +117,12 @@ def get_cache_key(topic, settings):
 def get_cached_response(topic, settings):
     """Get cached response for a topic if it exists, is not expired, and matches settings."""
     cache_key = get_cache_key(topic, settings)
-    cache_file = CACHE_DIR / f"{cache_key}.json"
-
-    if not cache_file.exists():
-        print("Cache file does not exist")
-        return None
 
     try:
-        with open(cache_file) as f:
-            cached_data = json.load(f)
+        cached_data = script_cache.get(cache_key)
+        if cached_data is None:
+            print("Script is not cached")
+            return None
 
         # Check if cache is expired
         cache_time = datetime.fromisoformat(cached_data.get("timestamp", 0))
@@ -165,7 +149,6 @@ def get_cached_response(topic, settings):
 def save_to_cache(topic, settings, response):
     """Save a successful response to cache."""
     cache_key = get_cache_key(topic, settings)
-    cache_file = CACHE_DIR / f"{cache_key}.json"
 
     cache_data = {
         "timestamp": datetime.now().isoformat(),
@@ -174,8 +157,7 @@ def save_to_cache(topic, settings, response):
     }
 
     try:
-        with open(cache_file, "w") as f:
-            json.dump(cache_data, f)
+        script_cache.set(cache_key, cache_data)
     except Exception as e:
         print(f"Error saving to cache: {e}")
 
@@ -227,6 +209,18 @@ def generate_conversation(topic, settings={}, max_retries=2):
         print("Using cached response")
         return cached_response
 
+    # Identical requests arriving together share a single Gemini call
+    return script_flights.do(
+        get_cache_key(topic, settings),
+        request_conversation,
+        topic,
+        settings,
+        max_retries,
+    )
+
+
+def request_conversation(topic, settings={}, max_retries=2):
+    """Ask Gemini for a conversation, retrying on invalid responses, and cache it."""
     attempt = 0
     last_error = None
 
@@ -258,10 +252,10 @@ def generate_conversation(topic, settings={}, max_retries=2):
             print(f"Error in attempt {attempt + 1}: {error_message}")
 
             # If it's a rate limit error, propagate it immediately
+            if isinstance(e, RateLimitExceeded):
+                raise
             if "rate limit" in error_message:
-                raise Exception(
-                    "Rate limit exceeded. Please try again in about an hour."
-                )
+                raise Exception("Rate limit exceeded. Please try again later.")
 
             last_error = e
             attempt += 1
@@ -270,3 +264,76 @@ def generate_conversation(topic, settings={}, max_retries=2):
                 raise Exception(
                     f"Failed to generate valid conversation after {max_retries + 1} attempts. Last error: {str(e)}"
                 )
+
+
+def stream_conversation_turns(topic, settings={}, on_script=None):
+    """
+    Generate a podcast conversation, yielding each turn as soon as the model
+    has finished writing it.
+
+    Once the response is complete it is validated and cached as usual, and
+    `on_script(conversation_json)` is called with the full script. If the
+    streamed response fails before any turn was yielded, this falls back to
+    generate_conversation and its retries.
+    """
+    cached_response = get_cached_response(topic, settings)
+    if cached_response:
+        print("Using cached response")
+        if on_script:
+            on_script(cached_response)
+        yield from cached_response["conversation"]
+        return
+
+    while True:
+        flight, is_leader = script_flights.join(get_cache_key(topic, settings))
+        if is_leader:
+            break
+        print("Waiting for an identical script request in progress")
+        try:
+            conversation_json = flight.wait()
+        except FlightCancelled:
+            continue  # Its consumer stopped; try again, perhaps as the leader
+        if on_script:
+            on_script(conversation_json)
+        yield from conversation_json["conversation"]
+        return
+
+    turns_yielded = 0
+    try:
+        try:
+            check_rate_limit()
+            prompt = generate_prompt(topic, settings)
+            print("Prompt:", prompt)
+
+            response = model.generate_content(prompt, stream=True)
+            scanner = JsonScanner(items_key="conversation")
+            for part in response:
+                for turn in scanner.feed(part.text):
+                    if (
+                        isinstance(turn, dict)
+                        and turn.get("speaker") in ("Host", "Guest")
+                        and turn.get("text")
+                    ):
+                        turns_yielded += 1
+                        yield turn
+
+            conversation_json = scanner.close()
+            validate_conversation_json(conversation_json)
+            save_to_cache(topic, settings, conversation_json)
+        except Exception as e:
+            if turns_yielded or "rate limit" in str(e).lower():
+                raise
+            print(f"Streaming generation failed, retrying without streaming: {e}")
+            conversation_json = request_conversation(topic, settings)
+            yield from conversation_json["conversation"]
+    except GeneratorExit:
+        # Only this consumer stopped; others waiting for the script retry
+        flight.cancel()
+        raise
+    except Exception as e:
+        flight.set_exception(e)
+        raise
+    flight.set_result(conversation_json)
+
+    if on_script:
+        on_script(conversation_json)
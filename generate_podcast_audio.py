@@ -1,6 +1,7 @@
 import json
 import os
-from google_tts import OutputFormat, generate_audio_from_chunks
+from chunk_planner import ChunkPlanner, to_emotional_ssml
+from google_tts import OutputFormat, TTS_CONCURRENCY, generate_audio_from_chunks
 
 
 default_host_voice = "en-US-Studio-Q"
@@ -14,72 +15,8 @@ def load_conversation(json_file):
     return data
 
 
-def chunk_conversation(
-    conversation,
-    char_limit=2000,
-    host_voice="en-US-Studio-Q",
-    guest_voice="en-US-Studio-O",
-):
-    """Split conversation into chunks under the character limit."""
-    chunks = []
-    current_chunk = []
-    current_length = 0
-
-    for entry in conversation["conversation"]:
-        # Count the total length including speaker markup
-        speaker_voice = host_voice if entry["speaker"] == "Host" else guest_voice
-        markup_length = len(speaker_voice) + 10
-        total_length = len(entry["text"]) + markup_length
-
-        # If adding this entry would exceed limit and we have entries in current chunk
-        if current_length + total_length > char_limit and current_chunk:
-            chunks.append(current_chunk)
-            current_chunk = []
-            current_length = 0
-
-        # If a single entry is longer than the limit, split it into smaller pieces
-        if total_length > char_limit:
-            words = entry["text"].split()
-            current_text = ""
-
-            for word in words:
-                if len(current_text) + len(word) + 1 > (
-                    char_limit - markup_length
-                ):  # Leave room for speaker markup
-                    if current_text:
-                        current_chunk.append(
-                            {"text": current_text.strip(), "speaker": speaker_voice}
-                        )
-                        chunks.append(current_chunk)
-                        current_chunk = []
-                        current_text = word
-                        current_length = len(word)
-                else:
-                    current_text += " " + word if current_text else word
-                    current_length = len(current_text)
-
-            if current_text:
-                current_chunk.append(
-                    {"text": current_text.strip(), "speaker": speaker_voice}
-                )
-                current_length = len(current_text)
-        else:
-            current_chunk.append({"text": entry["text"], "speaker": speaker_voice})
-            current_length += total_length
-
-    # Add any remaining entries
-    if current_chunk:
-        chunks.append(current_chunk)
-
-    return chunks
-
-
-def generate_podcast_audio(json_file, settings={}, format=OutputFormat.WAV):
-    """Generate podcast audio from JSON file."""
-    # Load the conversation
-    conversation = load_conversation(json_file)
-
-    # Speaker settings
+def speaker_voices(settings):
+    """Return (host voice, guest voice, multi_speaker) for audio settings."""
     voice_selector = settings.get(
         "voiceSelector",
         {"hostVoice": default_host_voice, "guestVoice": default_guest_voice},
@@ -94,16 +31,54 @@ def generate_podcast_audio(json_file, settings={}, format=OutputFormat.WAV):
     if "MultiSpeaker" in guest_voice and "MultiSpeaker" not in host_voice:
         raise Exception("Guest voice must be multispeaker")
 
-    # Split into chunks
-    chunks = chunk_conversation(
-        conversation,
-        char_limit=1000,
-        host_voice=host_voice,
-        guest_voice=guest_voice,
+    return host_voice, guest_voice, multi_speaker
+
+
+def generate_podcast_audio(
+    conversation,
+    settings={},
+    format=OutputFormat.WAV,
+    concurrency=TTS_CONCURRENCY,
+    on_progress=None,
+    with_voice=False,
+):
+    """
+    Generate podcast audio from a conversation dict, a JSON file path, or an
+    iterable of turns ({"speaker": "Host" | "Guest", "text": ...}).
+
+    Turns given as an iterable are synthesized as they arrive, so audio can
+    start before the whole script exists. `on_progress(completed, total)` is
+    called as TTS requests complete; total is None while the script is still
+    being produced. With `with_voice`, (voice name, audio) pairs are yielded.
+    """
+    # Load the conversation if given a file
+    if isinstance(conversation, (str, os.PathLike)):
+        conversation = load_conversation(conversation)
+
+    # Speaker settings
+    host_voice, guest_voice, multi_speaker = speaker_voices(settings)
+
+    # Split into chunks, measured by the bytes of each TTS request
+    planner = ChunkPlanner(
+        multi_speaker=multi_speaker,
+        render=to_emotional_ssml if settings.get("emotionMarkup") else None,
+    )
+    turns = (
+        conversation["conversation"] if isinstance(conversation, dict) else conversation
     )
+    chunks = planner.plan(turns, host_voice, guest_voice)
+    if isinstance(conversation, dict):
+        chunks = list(chunks)  # Known up front, so progress has a total
 
     # Generate audio from chunks using google_tts
-    audio_data = generate_audio_from_chunks(chunks, multi_speaker, format=format)
+    audio_data = generate_audio_from_chunks(
+        chunks,
+        multi_speaker,
+        format=format,
+        concurrency=concurrency,
+        on_progress=on_progress,
+        with_voice=with_voice,
+    )
 
     yield from audio_data
 
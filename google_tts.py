@@ -1,7 +1,19 @@
+import hashlib
+import json
+import os
+import queue
+import struct
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from io import BytesIO
+from google.api_core import exceptions as api_exceptions
 from google.cloud import texttospeech
+import numpy as np
 from pydub import AudioSegment
 from enum import Enum
+from disk_cache import DiskLRUCache
 
 locales = {
     "de-DE": "German (Germany)",
@@ -329,11 +341,149 @@ channel_count = 2
 bitrate = "192k"
 codec = "libmp3lame"
 
+# Maximum number of TTS requests kept in flight by generate_audio_from_chunks
+TTS_CONCURRENCY = int(os.getenv("TTS_CONCURRENCY", 4))
+
+# Long-lived TextToSpeech clients shared by every synthesis call
+TTS_CLIENT_POOL_SIZE = int(os.getenv("TTS_CLIENT_POOL_SIZE", TTS_CONCURRENCY))
+HEALTH_CHECK_TIMEOUT = 10  # seconds
+
+# Errors after which a client's channel is considered broken and replaced
+CLIENT_FAILURE_ERRORS = (
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.Unauthenticated,
+)
+
+
+class TextToSpeechClientPool:
+    """
+    Thread-safe pool of long-lived TextToSpeechClient instances.
+
+    Each client owns a gRPC channel, so reusing them avoids a credential
+    load and TLS handshake per request. Clients are created lazily up to
+    `size`; callers block once all of them are busy.
+    """
+
+    def __init__(self, size=TTS_CLIENT_POOL_SIZE, client_factory=None):
+        self.size = max(1, size)
+        self._client_factory = client_factory or texttospeech.TextToSpeechClient
+        self._idle = []  # Most recently used last
+        # Guards _idle and _created; notified whenever a client is returned
+        # or a slot is freed
+        self._condition = threading.Condition()
+        self._created = 0
+
+    def warm(self):
+        """Create all clients up front so the first requests skip channel setup."""
+        while self._reserve_slot():
+            try:
+                client = self._client_factory()
+            except Exception:
+                self._free_slot()
+                raise
+            self._release(client, healthy=True)
+
+    @contextmanager
+    def client(self):
+        """Borrow a client for the duration of the `with` block."""
+        client = self._acquire()
+        healthy = True
+        try:
+            yield client
+        except CLIENT_FAILURE_ERRORS:
+            healthy = False
+            raise
+        finally:
+            self._release(client, healthy)
+
+    def health_check(self):
+        """
+        Probe each idle client with a cheap list_voices call and discard the
+        ones that fail. Returns the number of healthy idle clients.
+        """
+        with self._condition:
+            clients, self._idle = self._idle, []
+
+        healthy = 0
+        for client in clients:
+            try:
+                client.list_voices(language_code="en-US", timeout=HEALTH_CHECK_TIMEOUT)
+            except Exception as e:
+                print(f"Discarding unhealthy TTS client: {e}")
+                self._discard(client)
+            else:
+                self._release(client, healthy=True)
+                healthy += 1
+        return healthy
+
+    def _acquire(self):
+        """
+        Take an idle client, or create one if a slot is free, waiting until
+        either is possible.
+        """
+        with self._condition:
+            while not self._idle and self._created >= self.size:
+                self._condition.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._created += 1
+
+        try:
+            return self._client_factory()
+        except Exception:
+            self._free_slot()
+            raise
+
+    def _release(self, client, healthy):
+        if not healthy:
+            self._discard(client)
+            return
+        with self._condition:
+            self._idle.append(client)
+            self._condition.notify()
+
+    def _discard(self, client):
+        try:
+            client.transport.close()
+        except Exception:
+            pass
+        self._free_slot()
+
+    def _reserve_slot(self):
+        with self._condition:
+            if self._created >= self.size:
+                return False
+            self._created += 1
+            return True
+
+    def _free_slot(self):
+        with self._condition:
+            self._created -= 1
+            self._condition.notify()
+
+
+client_pool = TextToSpeechClientPool()
+
+# Content-addressed cache of synthesized audio, keyed by the full request
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "cache/tts")
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+
+audio_cache = DiskLRUCache(TTS_CACHE_DIR, TTS_CACHE_MAX_BYTES, suffix=".audio")
+
+
+def get_audio_cache_key(synthesis_input, voice, audio_config):
+    """Hash everything that affects the synthesized audio into a cache key."""
+    request = {
+        "input": texttospeech.SynthesisInput.to_dict(synthesis_input),
+        "voice": texttospeech.VoiceSelectionParams.to_dict(voice),
+        "audio_config": texttospeech.AudioConfig.to_dict(audio_config),
+    }
+    request_str = json.dumps(request, sort_keys=True)
+    return hashlib.sha256(request_str.encode()).hexdigest()
+
 
 def synthesize_input(synthesis_input, voice_params, format=OutputFormat.WAV):
     """Synthesize a single chunk of conversation and yield audio content."""
-    client = texttospeech.TextToSpeechClient()
-
     audio_config = texttospeech.AudioConfig(
         audio_encoding=OutputFormat.get_encoding(format=format),
         sample_rate_hertz=sample_rate_hertz,
@@ -345,16 +495,26 @@ def synthesize_input(synthesis_input, voice_params, format=OutputFormat.WAV):
 
     voice = texttospeech.VoiceSelectionParams(**voice_params)
 
-    response = client.synthesize_speech(
-        input=synthesis_input, voice=voice, audio_config=audio_config
-    )
+    cache_key = get_audio_cache_key(synthesis_input, voice, audio_config)
+    audio_content = audio_cache.get(cache_key)
 
-    yield response.audio_content
+    if audio_content is None:
+        with client_pool.client() as client:
+            response = client.synthesize_speech(
+                input=synthesis_input, voice=voice, audio_config=audio_config
+            )
+        audio_content = response.audio_content
+        audio_cache.set(cache_key, audio_content)
 
+    yield audio_content
 
-def synthesize_text(text, voice_params, format=OutputFormat.WAV):
-    """Synthesize a single chunk of conversation."""
-    synthesis_input = texttospeech.SynthesisInput(text=text)
+
+def synthesize_text(text, voice_params, format=OutputFormat.WAV, ssml=False):
+    """Synthesize a single chunk of conversation, given as plain text or SSML."""
+    if ssml:
+        synthesis_input = texttospeech.SynthesisInput(ssml=text)
+    else:
+        synthesis_input = texttospeech.SynthesisInput(text=text)
     for audio_content in synthesize_input(synthesis_input, voice_params, format):
         yield audio_content
 
@@ -380,145 +540,659 @@ def synthesize_multi_speaker_chunk(chunk, voice_params, format=OutputFormat.WAV)
         yield audio_content
 
 
-def combine_audio_files(
-    audio_files,
+sample_width = 2  # 16-bit PCM is used between pipeline stages
+
+
+def open_audio(audio):
+    """Return a path or file object for `audio`, which may be a path or bytes-like."""
+    if isinstance(audio, (bytes, bytearray, memoryview)):
+        return BytesIO(audio)
+    return audio
+
+
+def parse_wav(audio):
+    """
+    Parse a PCM WAV file held in memory, such as a LINEAR16 TTS response.
+
+    Returns (sample_rate, channel_count, sample_width, pcm), where pcm is a
+    memoryview of the sample data, or None if `audio` is not PCM WAV.
+    """
+    view = memoryview(audio).cast("B")
+    if len(view) < 12 or view[0:4] != b"RIFF" or view[8:12] != b"WAVE":
+        return None
+
+    offset = 12
+    audio_format = None
+    while offset + 8 <= len(view):
+        chunk_id = view[offset : offset + 4].tobytes()
+        (chunk_size,) = struct.unpack_from("<I", view, offset + 4)
+        body = offset + 8
+        if chunk_id == b"fmt " and chunk_size >= 16:
+            audio_format, channels, rate, _, _, bits = struct.unpack_from(
+                "<HHIIHH", view, body
+            )
+        elif chunk_id == b"data" and audio_format == 1:  # 1 = integer PCM
+            # Streamed WAVs may leave the size unset, so trust the buffer
+            end = min(body + chunk_size, len(view))
+            return rate, channels, bits // 8, view[body:end]
+        offset = body + chunk_size + (chunk_size & 1)  # Chunks are word-aligned
+    return None
+
+
+def decode_to_pcm(audio, sample_rate=sample_rate_hertz, channel_count=channel_count):
+    """
+    Decode audio (a file path or encoded bytes) into raw 16-bit PCM bytes.
+
+    PCM WAV in memory at the requested rate is not decoded at all: samples
+    already in the requested layout are returned as a memoryview into
+    `audio`, and mono samples (what TTS returns for LINEAR16) are copied
+    into every channel.
+    """
+    if isinstance(audio, (bytes, bytearray, memoryview)):
+        wav = parse_wav(audio)
+        if wav is not None and wav[:3] == (sample_rate, channel_count, sample_width):
+            return wav[3]
+        if wav is not None and wav[:3] == (sample_rate, 1, sample_width):
+            pcm = wav[3][: len(wav[3]) - len(wav[3]) % sample_width]
+            return np.repeat(np.frombuffer(pcm, dtype="<i2"), channel_count).tobytes()
+
+    segment = AudioSegment.from_file(open_audio(audio))
+    segment = (
+        segment.set_frame_rate(sample_rate)
+        .set_channels(channel_count)
+        .set_sample_width(sample_width)
+    )
+    return segment.raw_data
+
+
+class PcmEncoder:
+    """
+    Long-lived ffmpeg process that encodes 16-bit PCM piped into its stdin.
+
+    Subclasses choose the output parameters and where the encoded bytes go.
+    """
+
+    def __init__(
+        self,
+        output_params,
+        output,
+        sample_rate=sample_rate_hertz,
+        channel_count=channel_count,
+        stdout=None,
+    ):
+        self.sample_rate = sample_rate
+        self.channel_count = channel_count
+
+        command = [
+            AudioSegment.converter,
+            "-y",
+            "-loglevel",
+            "error",
+            # Raw PCM needs no probing; probing would delay the first output
+            "-probesize",
+            "32",
+            "-analyzeduration",
+            "0",
+            "-f",
+            "s16le",
+            "-ar",
+            str(sample_rate),
+            "-ac",
+            str(channel_count),
+            "-i",
+            "pipe:0",
+            *output_params,
+            output,
+        ]
+        self._process = subprocess.Popen(
+            command, stdin=subprocess.PIPE, stdout=stdout, stderr=subprocess.PIPE
+        )
+
+    def append(self, audio):
+        """Decode audio (a file path or encoded bytes) and append its samples."""
+        self.write_pcm(decode_to_pcm(audio, self.sample_rate, self.channel_count))
+
+    def write_pcm(self, pcm):
+        """Append raw 16-bit PCM matching the encoder's sample rate and channels."""
+        try:
+            self._process.stdin.write(pcm)
+        except BrokenPipeError:
+            self._process.wait()
+            raise Exception(f"Audio encoder exited early: {self._read_errors()}")
+
+    def close(self):
+        """Flush the encoder and wait for it to finish."""
+        self._process.stdin.close()
+        if self._process.wait() != 0:
+            raise Exception(f"Audio encoding failed: {self._read_errors()}")
+
+    def abort(self):
+        """Stop the encoder without finalizing its output."""
+        self._process.kill()
+        self._process.wait()
+        try:
+            self._process.stdin.close()
+        except BrokenPipeError:
+            pass
+
+    def _read_errors(self):
+        return self._process.stderr.read().decode(errors="replace").strip()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class AudioFileWriter(PcmEncoder):
+    """
+    Encode a stream of PCM into a single output file with one ffmpeg process.
+
+    PCM is piped into ffmpeg as it is appended, so memory use stays constant
+    and the total work is linear in the length of the podcast.
+    """
+
+    def __init__(
+        self,
+        output_file,
+        format=OutputFormat.WAV,
+        sample_rate=sample_rate_hertz,
+        channel_count=channel_count,
+        bitrate=bitrate,
+        codec=codec,
+    ):
+        self.output_file = output_file
+
+        if format == OutputFormat.MP3:
+            output_params = ["-codec:a", codec, "-b:a", bitrate, "-f", "mp3"]
+        elif format == OutputFormat.OGG:
+            output_params = ["-codec:a", "libopus", "-f", "ogg"]
+        else:
+            output_params = ["-codec:a", "pcm_s16le", "-f", "wav"]
+
+        super().__init__(output_params, output_file, sample_rate, channel_count)
+
+
+class WavWriter:
+    """
+    Write a stream of 16-bit PCM straight into a WAV file, without ffmpeg.
+
+    Samples are appended to the file as they come, so memory use does not
+    grow with the length of the podcast. The header is written up front
+    with placeholder sizes, which close patches in place once the amount of
+    audio is known. WAV sizes are 32-bit; longer audio is written with the
+    sizes capped, which most players read as "until the end of the file".
+    """
+
+    header_size = 44
+
+    def __init__(
+        self,
+        output_file,
+        sample_rate=sample_rate_hertz,
+        channel_count=channel_count,
+    ):
+        self.output_file = output_file
+        self.sample_rate = sample_rate
+        self.channel_count = channel_count
+        self._data_size = 0
+        self._file = open(output_file, "wb")
+        self._file.write(self._header(0))
+
+    def append(self, audio):
+        """Decode audio (a file path or encoded bytes) and append its samples."""
+        self.write_pcm(decode_to_pcm(audio, self.sample_rate, self.channel_count))
+
+    def write_pcm(self, pcm):
+        """Append raw 16-bit PCM matching the writer's sample rate and channels."""
+        self._data_size += self._file.write(pcm)
+
+    def close(self):
+        """Fill in the sizes in the header and close the file."""
+        self._file.seek(0)
+        self._file.write(self._header(self._data_size))
+        self._file.close()
+
+    def abort(self):
+        """Close the file, leaving the header incomplete."""
+        self._file.close()
+
+    def _header(self, data_size):
+        block_align = self.channel_count * sample_width
+        return struct.pack(
+            "<4sI4s4sIHHIIHH4sI",
+            b"RIFF",
+            min(self.header_size - 8 + data_size, 0xFFFFFFFF),
+            b"WAVE",
+            b"fmt ",
+            16,
+            1,  # Integer PCM
+            self.channel_count,
+            self.sample_rate,
+            self.sample_rate * block_align,
+            block_align,
+            sample_width * 8,
+            b"data",
+            min(data_size, 0xFFFFFFFF),
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+# Layer III bitrates (kbit/s) by bitrate index, for MPEG-1 and MPEG-2/2.5
+MP3_BITRATES = {
+    1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+MP3_SAMPLE_RATES = (44100, 48000, 32000)
+
+
+def mp3_frame_info(header):
+    """
+    Return (frame length, side information length) of the MPEG Layer III
+    frame starting with the 4-byte `header`, or None if it isn't one.
+    """
+    if len(header) < 4 or header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return None
+    version_bits = (header[1] >> 3) & 3  # 3: MPEG-1, 2: MPEG-2, 0: MPEG-2.5
+    if version_bits == 1 or (header[1] >> 1) & 3 != 1:
+        return None  # Reserved version, or not Layer III
+    bitrate_index = header[2] >> 4
+    sample_rate_index = (header[2] >> 2) & 3
+    if bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+    mpeg1 = version_bits == 3
+    bitrate = MP3_BITRATES[1 if mpeg1 else 2][bitrate_index] * 1000
+    # MPEG-2 halves the MPEG-1 sample rates, MPEG-2.5 quarters them
+    sample_rate = MP3_SAMPLE_RATES[sample_rate_index] >> {3: 0, 2: 1, 0: 2}[version_bits]
+    padding = (header[2] >> 1) & 1
+    frame_length = (144 if mpeg1 else 72) * bitrate // sample_rate + padding
+    mono = header[3] >> 6 == 3
+    side_info_length = (17 if mono else 32) if mpeg1 else (9 if mono else 17)
+    if not header[1] & 1:
+        side_info_length += 2  # CRC
+    return frame_length, side_info_length
+
+
+def strip_mp3_headers(audio, keep_id3=False):
+    """
+    Return MP3 `audio` without its leading ID3v2 tag and Xing/Info frame.
+
+    TTS returns each chunk as a complete MP3 file. Concatenated as they
+    are, the tag of every later chunk lands in the middle of the audio, and
+    a Xing/Info frame describes only its own chunk, so players would report
+    the length and seek positions of the first chunk for the whole file.
+    """
+    audio = memoryview(audio)
+    if audio[:3] == b"ID3" and len(audio) >= 10:
+        size = 0
+        for byte in audio[6:10]:  # Syncsafe: 7 bits per byte
+            size = size << 7 | byte & 0x7F
+        size += 20 if audio[5] & 0x10 else 10  # Header, and footer if flagged
+        tag, audio = audio[:size], audio[size:]
+    else:
+        tag = audio[:0]
+
+    frame_info = mp3_frame_info(audio[:4])
+    if frame_info is not None:
+        frame_length, side_info_length = frame_info
+        marker = audio[4 + side_info_length : 8 + side_info_length]
+        if marker in (b"Xing", b"Info"):
+            audio = audio[frame_length:]
+
+    if keep_id3 and tag:
+        return bytes(tag) + bytes(audio)
+    return audio
+
+
+class PassthroughFile:
+    """
+    Stand-in for an audio file writer when TTS already returns the file's
+    codec: chunks are appended to the file as they are, keeping only the
+    first chunk's ID3 tag and no Xing/Info frame (see strip_mp3_headers).
+    """
+
+    def __init__(self, output_file):
+        self.output_file = output_file
+        self._file = open(output_file, "wb")
+        self._first = True
+
+    def append(self, audio):
+        if not isinstance(audio, (bytes, bytearray, memoryview)):
+            with open(audio, "rb") as chunk_file:
+                audio = chunk_file.read()
+        self._file.write(strip_mp3_headers(audio, keep_id3=self._first))
+        self._first = False
+
+    def close(self):
+        self._file.close()
+
+    def abort(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def audio_file_writer(
     output_file,
     format=OutputFormat.WAV,
     sample_rate=sample_rate_hertz,
     channel_count=channel_count,
     bitrate=bitrate,
     codec=codec,
+    passthrough=False,
 ):
-    """Combine multiple audio files into a single file."""
-    combined = AudioSegment.empty()
-    for audio_file in audio_files:
-        segment = AudioSegment.from_file(audio_file)
-        combined += segment
-
-    if format == OutputFormat.MP3:
-        combined.export(
-            output_file,
-            format="mp3",
-            parameters=[
-                "-ar",
-                str(sample_rate),
-                "-ac",
-                str(channel_count),
-                "-b:a",
-                bitrate,
-                "-codec:a",
-                codec,
-            ],
-        )
-    elif format == OutputFormat.OGG:
-        combined.export(output_file, format="ogg", codec="libopus")
-    else:
-        combined.export(
-            output_file,
-            format="wav",
-            parameters=[
-                "-ar",
-                str(sample_rate),
-                "-ac",
-                str(channel_count),
-            ],
-        )
+    """
+    Open a writer that builds `output_file` from appended audio: a
+    PassthroughFile with `passthrough`, a WavWriter for WAV, which needs no
+    encoding, otherwise an AudioFileWriter.
+    """
+    if passthrough:
+        return PassthroughFile(output_file)
+    if format == OutputFormat.WAV:
+        return WavWriter(output_file, sample_rate, channel_count)
+    return AudioFileWriter(
+        output_file,
+        format=format,
+        sample_rate=sample_rate,
+        channel_count=channel_count,
+        bitrate=bitrate,
+        codec=codec,
+    )
 
 
-def get_supported_stream(
-    audio_file_path,
-    supported_stream_type='audio/webm; codecs="opus"',
-    is_first_chunk=False,
-    webm_params=None,
-):
+# ffmpeg output parameters for each MIME type the browser can stream
+stream_output_params = {
+    'audio/webm; codecs="opus"': [
+        "-codec:a",
+        "libopus",
+        "-f",
+        "webm",
+        "-cluster_size_limit",
+        "2048",
+        "-cluster_time_limit",
+        "5000",
+    ],
+    "audio/ogg": ["-codec:a", "libopus", "-f", "ogg"],
+    "audio/mpeg": ["-codec:a", codec, "-b:a", bitrate, "-f", "mp3"],
+    'audio/mp4; codecs="mp4a.40.2"': [
+        "-codec:a",
+        "aac",
+        "-f",
+        "mp4",
+        "-movflags",
+        "frag_keyframe+empty_moov+default_base_moof",
+    ],
+}
+
+
+class StreamEncoder(PcmEncoder):
+    """
+    Encode a task's PCM into one continuous stream for the /stream consumer.
+
+    A single ffmpeg process is kept for the whole task, so there is no
+    per-chunk process startup and no container restart between chunks.
+    Encoded bytes are handed to `on_data` from a reader thread as soon as
+    ffmpeg produces them.
     """
-    Opens an audio file and reads its content into a BytesIO stream.
 
-    Args:
-        audio_file_path (str): Path to the audio file.
-        format (OutputFormat): Format of the audio file.
-        supported_stream_type (str): MIME type of the stream to be generated.
-        is_first_chunk (bool): Whether this is the first chunk of a streaming response.
-        webm_params (dict): Optional dictionary of parameters for WebM encoding.
+    def __init__(
+        self,
+        supported_stream_type,
+        on_data,
+        sample_rate=sample_rate_hertz,
+        channel_count=channel_count,
+    ):
+        if supported_stream_type not in stream_output_params:
+            raise Exception("Unsupported stream type")
 
-    Returns:
-        bytes: The audio content of the file in the specified format.
+        output_params = [
+            *stream_output_params[supported_stream_type],
+            "-flush_packets",
+            "1",
+        ]
+        super().__init__(
+            output_params,
+            "pipe:1",
+            sample_rate,
+            channel_count,
+            stdout=subprocess.PIPE,
+        )
+
+        self._on_data = on_data
+        self._reader = threading.Thread(target=self._read_output, daemon=True)
+        self._reader.start()
+
+    def _read_output(self):
+        while True:
+            data = self._process.stdout.read1(65536)
+            if not data:
+                break
+            self._on_data(data)
+
+    def close(self):
+        """Flush the remaining audio to `on_data` and wait for the encoder."""
+        self._process.stdin.close()
+        self._reader.join()
+        if self._process.wait() != 0:
+            raise Exception(f"Audio encoding failed: {self._read_errors()}")
+
+    def abort(self):
+        super().abort()
+        self._reader.join()
+
+
+class PassthroughStream:
     """
-    if webm_params is None:
-        webm_params = {
-            "cluster_size_limit": "2048",
-            "cluster_time_limit": "5000",
-            "dash": "1",
-        }
+    Stand-in for StreamEncoder when TTS already returns the stream's codec.
 
+    Chunks are handed to `on_data` without decoding or encoding, only
+    stripped of the headers that would otherwise repeat in the middle of
+    the stream (see strip_mp3_headers).
     """
-    Opens an audio file and reads its content into a BytesIO stream.
 
-    Args:
-        audio_file_path (str): Path to the audio file.
-        format (OutputFormat): Format of the audio file.
-        supported_stream_type (str): MIME type of the stream to be generated.
-        is_first_chunk (bool): Whether this is the first chunk of a streaming response.
+    def __init__(self, on_data):
+        self._on_data = on_data
+        self._first = True
+
+    def append(self, audio):
+        self._on_data(bytes(strip_mp3_headers(audio, keep_id3=self._first)))
+        self._first = False
+
+    def close(self):
+        pass
+
+    def abort(self):
+        pass
 
-    Returns:
-        bytes: The audio content of the file in the specified format.
+
+# Stream types that are valid as plain concatenations of TTS chunks
+passthrough_stream_types = {OutputFormat.MP3: "audio/mpeg"}
+
+
+class AudioPlan:
+    """
+    The encoding to request from TTS for a task, and whether the stream and
+    the output file can take the returned chunks as they are.
     """
-    with open(audio_file_path, "rb") as f:
-        segment = AudioSegment.from_file(f)
 
-    stream = BytesIO()
+    def __init__(self, synthesis_format, stream_passthrough, file_passthrough):
+        self.synthesis_format = synthesis_format
+        self.stream_passthrough = stream_passthrough
+        self.file_passthrough = file_passthrough
 
-    if supported_stream_type == 'audio/webm; codecs="opus"':
-        # Construct parameters for WebM encoding
-        params = [
-            "-cluster_size_limit",
-            webm_params["cluster_size_limit"],
-            "-cluster_time_limit",
-            webm_params["cluster_time_limit"],
-        ]
-        if not is_first_chunk:
-            params.extend(["-dash", webm_params["dash"]])
-
-        # Export with WebM header (if first chunk) or without (subsequent chunks)
-        segment.export(stream, format="webm", codec="libopus", parameters=params)
-    elif supported_stream_type == "audio/ogg":
-        segment.export(stream, format="ogg", codec="libopus")
-    elif supported_stream_type == "audio/mpeg":
-        segment.export(stream, format="mpeg")
-    elif supported_stream_type == 'audio/mp4; codecs="mp4a.40.2"':
-        segment.export(stream, format="mp4", codec="mp4a.40.2")
-    else:
-        raise Exception("Unsupported stream type")
 
-    stream.seek(0)
-    return stream.read()
+def plan_audio(output_format, supported_stream_type, pcm=False):
+    """
+    Choose the TTS encoding so that audio is encoded at most once on its way
+    to each destination.
 
+    MP3 chunks can simply be concatenated, so when both the output file and
+    the stream are MP3, TTS is asked for MP3 and both are copies. Anything
+    else gets LINEAR16 from TTS, which encoders read without a lossy decode,
+    and which a WAV file stores as-is; asking for MP3 there would have the
+    stream encoder decode and re-encode it, two lossy generations. So does
+    every task whose samples are processed on the way (`pcm`), e.g. by a
+    TurnAssembler.
+    """
+    if (
+        not pcm
+        and output_format in passthrough_stream_types
+        and passthrough_stream_types[output_format] == supported_stream_type
+    ):
+        return AudioPlan(output_format, stream_passthrough=True, file_passthrough=True)
+    return AudioPlan(OutputFormat.WAV, stream_passthrough=False, file_passthrough=False)
 
-def generate_audio_from_chunks(chunks, multi_speaker=False, format=OutputFormat.WAV):
-    """Generate audio from chunks and combine into a single file."""
-    # Yield audio data for each chunk
+
+def _synthesis_jobs(chunks, multi_speaker=False, format=OutputFormat.WAV):
+    """
+    Yield ((label, voice), job) pairs in script order, one per TTS request.
+    """
+    # Chunks may be a lazily produced iterator, whose length is unknown
+    chunk_count = f" / {len(chunks)}" if hasattr(chunks, "__len__") else ""
     for i, chunk in enumerate(chunks):
         if multi_speaker is False:
             for j, chunk_entry in enumerate(chunk):
                 current_speaker = chunk_entry["speaker"]
                 current_text = chunk_entry["text"]
+                is_ssml = chunk_entry.get("ssml", False)
                 voice_params = {
                     "language_code": "-".join(current_speaker.split("-")[:2]),
                     "name": current_speaker,
                 }
-                for audio_content in synthesize_text(
-                    current_text, voice_params, format
-                ):
-                    yield audio_content
-                print(f"Generated chunk {i+1}-{j+1} / {len(chunks)}")
+                yield (
+                    (f"{i+1}-{j+1}{chunk_count}", current_speaker),
+                    lambda text=current_text, params=voice_params, ssml=is_ssml: list(
+                        synthesize_text(text, params, format, ssml=ssml)
+                    ),
+                )
         else:
             # Hard code for now
             voice_params = {
                 "language_code": "en-US",
                 "name": "en-US-Studio-MultiSpeaker",
             }
-            for audio_content in synthesize_multi_speaker_chunk(
-                chunk, voice_params, format
-            ):
-                yield audio_content
-            print(f"Generated chunk {i+1} / {len(chunks)}")
+            yield (
+                (f"{i+1}{chunk_count}", voice_params["name"]),
+                lambda chunk=chunk: list(
+                    synthesize_multi_speaker_chunk(chunk, voice_params, format)
+                ),
+            )
+
+
+def count_synthesis_jobs(chunks, multi_speaker=False):
+    """
+    Number of TTS requests generate_audio_from_chunks will make for `chunks`,
+    or None if chunks is an iterator.
+    """
+    if not hasattr(chunks, "__len__"):
+        return None
+    if multi_speaker:
+        return len(chunks)
+    return sum(len(chunk) for chunk in chunks)
+
+
+def _synthesis_results(jobs, concurrency):
+    """Run synthesis jobs, up to `concurrency` at once, yielding results in order."""
+    if concurrency <= 1:
+        for label, job in jobs:
+            yield label, job()
+        return
+
+    # Jobs are pulled and submitted on a feeder thread, so results can be
+    # yielded while the next job is still being produced (e.g. by a model
+    # streaming the script)
+    executor = ThreadPoolExecutor(
+        max_workers=concurrency, thread_name_prefix="tts-synthesis"
+    )
+    slots = threading.Semaphore(concurrency)  # Limits requests in flight
+    in_flight = queue.Queue()  # (label, future) in script order
+    stopped = threading.Event()
+    end_of_jobs = object()
+
+    def feed():
+        try:
+            for label, job in jobs:
+                slots.acquire()
+                if stopped.is_set():
+                    return
+                in_flight.put((label, executor.submit(job)))
+        except Exception as e:
+            in_flight.put((None, e))
+            return
+        in_flight.put((None, end_of_jobs))
+
+    feeder = threading.Thread(target=feed, name="tts-feeder", daemon=True)
+    feeder.start()
+
+    try:
+        while True:
+            label, future = in_flight.get()
+            if future is end_of_jobs:
+                return
+            if isinstance(future, Exception):
+                raise future
+            yield label, future.result()
+            slots.release()
+    finally:
+        # The consumer may stop early (e.g. on failure); drop queued requests
+        stopped.set()
+        slots.release()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def generate_audio_from_chunks(
+    chunks,
+    multi_speaker=False,
+    format=OutputFormat.WAV,
+    concurrency=TTS_CONCURRENCY,
+    on_progress=None,
+    with_voice=False,
+):
+    """
+    Generate audio for each chunk, yielding audio content in script order.
+
+    Up to `concurrency` TTS requests are kept in flight at once. Results are
+    yielded strictly in the order of the script, so a slow request holds back
+    later (already finished) ones rather than reordering the podcast.
+
+    If given, `on_progress(completed, total)` is called each time the audio
+    of another TTS request has been yielded. With `with_voice`, (voice name,
+    audio content) pairs are yielded instead; multi-speaker chunks all have
+    the multi-speaker voice.
+    """
+    jobs = _synthesis_jobs(chunks, multi_speaker, format)
+    total = count_synthesis_jobs(chunks, multi_speaker)
+    results = _synthesis_results(jobs, concurrency)
+
+    try:
+        for completed, ((label, voice), audio_contents) in enumerate(
+            results, start=1
+        ):
+            if with_voice:
+                yield from ((voice, audio) for audio in audio_contents)
+            else:
+                yield from audio_contents
+            print(f"Generated chunk {label}")
+            if on_progress is not None:
+                on_progress(completed, total)
+    finally:
+        results.close()
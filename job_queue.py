@@ -0,0 +1,89 @@
+import heapq
+import itertools
+import math
+import threading
+import time
+from collections import deque
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while the pending queue is full."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Job queue is full. Please retry in {retry_after} seconds.")
+        self.retry_after = retry_after
+
+
+class JobExecutor:
+    """
+    Fixed pool of worker threads fed from a bounded priority queue.
+
+    Jobs with a lower priority value run first; jobs with equal priority run
+    in submission order. When `max_pending` jobs are already waiting, submit
+    raises QueueFull instead of queuing more work.
+    """
+
+    def __init__(self, max_workers=2, max_pending=10, name="job-worker"):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._condition = threading.Condition()
+        self._pending = []  # heap of (priority, seq, job_id, fn, args)
+        self._counter = itertools.count()
+        self._running = set()
+        self._durations = deque(maxlen=20)  # seconds, for Retry-After estimates
+
+        for i in range(max_workers):
+            worker = threading.Thread(
+                target=self._work, name=f"{name}-{i}", daemon=True
+            )
+            worker.start()
+
+    def submit(self, job_id, fn, *args, priority=0):
+        """Queue `fn(*args)` to run on a worker, or raise QueueFull."""
+        with self._condition:
+            if len(self._pending) >= self.max_pending:
+                raise QueueFull(self._retry_after())
+            heapq.heappush(
+                self._pending, (priority, next(self._counter), job_id, fn, args)
+            )
+            self._condition.notify()
+
+    def position(self, job_id):
+        """1-based position of a waiting job, 0 if running, None if unknown."""
+        with self._condition:
+            if job_id in self._running:
+                return 0
+            for position, entry in enumerate(sorted(self._pending), start=1):
+                if entry[2] == job_id:
+                    return position
+        return None
+
+    def depth(self):
+        """Number of jobs waiting for a worker."""
+        with self._condition:
+            return len(self._pending)
+
+    def _retry_after(self):
+        """Estimate seconds until a queue slot frees up. Caller holds the lock."""
+        if not self._durations:
+            return 30
+        average_duration = sum(self._durations) / len(self._durations)
+        return max(1, math.ceil(average_duration / self.max_workers))
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                _, _, job_id, fn, args = heapq.heappop(self._pending)
+                self._running.add(job_id)
+
+            start_time = time.monotonic()
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"Job {job_id} failed: {e}")
+            finally:
+                with self._condition:
+                    self._running.discard(job_id)
+                    self._durations.append(time.monotonic() - start_time)
@@ -0,0 +1,266 @@
+import json
+import re
+
+# Runs of string content that can be copied to the output unchanged
+DOUBLE_QUOTED_RUN = re.compile(r'[^"\\\x00-\x1f]+')
+SINGLE_QUOTED_RUN = re.compile(r"[^'\"\\\x00-\x1f]+")
+BARE_WORD_RUN = re.compile(r"[^\s{}\[\]:,\"']+")
+NUMBER = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?")
+
+# Characters that may follow the real closing quote of a string
+STRING_CLOSERS = ",}]:"
+VALID_ESCAPES = '"\\/bfnrtu'
+LITERALS = {
+    "true": "true",
+    "false": "false",
+    "null": "null",
+    "True": "true",
+    "False": "false",
+    "None": "null",
+}
+
+
+class _Frame:
+    """An open object or array."""
+
+    __slots__ = ("closer", "expecting_key", "items", "key", "start")
+
+    def __init__(self, closer, key, start):
+        self.closer = closer  # "}" or "]"
+        self.expecting_key = closer == "}"
+        self.items = 0
+        self.key = key  # Key this container is the value of, if any
+        self.start = start  # Index of its first piece in the output
+
+
+class JsonScanner:
+    """
+    Single-pass, tolerant scanner for the JSON object in a model response.
+
+    Text is fed in pieces as it arrives and every character is looked at
+    once. Anything before the first "{" or after the matching "}" (prose,
+    Markdown fences) is skipped. While copying the object, common defects are
+    repaired without changing the contents of strings:
+
+    * missing, doubled and trailing commas, and missing colons
+    * single-quoted strings and unquoted keys or values
+    * Python literals (True, False, None)
+    * raw newlines and unescaped inner quotes inside strings
+    * invalid escapes, and mismatched closing brackets
+
+    Items of the top-level array under `items_key` are returned by feed as
+    soon as each one is complete, so a streamed script can be used before
+    the response ends.
+    """
+
+    def __init__(self, items_key="conversation"):
+        self.items_key = items_key
+        self._out = []  # Repaired JSON, in pieces
+        self._stack = []
+        self._started = False
+        self._done = False
+        self._string = None  # Quote character of the string being read
+        self._string_is_key = False
+        self._string_start = 0
+        self._escape = False  # The previous string character was a backslash
+        self._pending_close = None  # Whitespace read after a possible closing quote
+        self._word = None  # Bare word being read
+        self._items = []
+
+    def feed(self, text):
+        """Scan more text and return the items completed by it."""
+        self._items = []
+        i = 0
+        n = len(text)
+
+        while i < n and not self._done:
+            if not self._started:
+                i = text.find("{", i)
+                if i < 0:
+                    break
+                self._started = True
+                self._open("}", i)
+                i += 1
+            elif self._pending_close is not None:
+                i = self._resolve_close(text, i)
+            elif self._string is not None:
+                i = self._read_string(text, i)
+            elif self._word is not None:
+                match = BARE_WORD_RUN.match(text, i)
+                if match:
+                    self._word += match.group(0)
+                    i = match.end()
+                if i < n:
+                    self._end_word()
+            else:
+                i = self._read_token(text, i)
+
+        return self._items
+
+    def close(self):
+        """Finish scanning and return the parsed object."""
+        if self._pending_close is not None:
+            self._close_string()
+        if self._word is not None:
+            self._end_word()
+        if not self._started:
+            raise ValueError("No JSON object found in the response")
+        if not self._done:
+            raise ValueError("JSON object in the response is incomplete")
+
+        try:
+            return json.loads("".join(self._out))
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Failed to parse JSON after repair: {e}")
+
+    def _read_token(self, text, i):
+        char = text[i]
+        if char.isspace() or char in ",:":
+            # Commas and colons are written as needed, not copied
+            return i + 1
+        if char in "{[":
+            self._begin_value()
+            self._open("}" if char == "{" else "]", i)
+        elif char in "}]":
+            self._close_container(char)
+        elif char in "\"'":
+            self._begin_value()
+            self._string = char
+            self._string_start = len(self._out)
+            self._out.append('"')
+        else:
+            self._word = ""
+            return i
+        return i + 1
+
+    def _begin_value(self):
+        """Write the separator before a key or value in the innermost container."""
+        frame = self._stack[-1]
+        if frame.expecting_key or frame.closer == "]":
+            if frame.items:
+                self._out.append(",")
+            frame.items += 1
+        self._string_is_key = frame.expecting_key
+
+    def _end_value(self):
+        if self._stack:
+            self._stack[-1].expecting_key = self._stack[-1].closer == "}"
+        else:
+            self._done = True
+
+    def _end_key(self, key):
+        frame = self._stack[-1]
+        frame.key = key
+        frame.expecting_key = False
+        self._out.append(":")
+
+    def _open(self, closer, position):
+        key = self._stack[-1].key if self._stack else None
+        if self._stack and self._stack[-1].expecting_key:
+            raise ValueError(f"Expected a key at position {position}")
+        self._stack.append(_Frame(closer, key, len(self._out)))
+        self._out.append("{" if closer == "}" else "[")
+
+    def _close_container(self, closer):
+        if not any(frame.closer == closer for frame in self._stack):
+            return  # Stray closing bracket
+        while True:
+            frame = self._stack.pop()
+            if frame.closer == "}" and not frame.expecting_key:
+                self._out.append("null")  # Key without a value
+            self._out.append(frame.closer)
+            self._collect_item(frame)
+            if frame.closer == closer:
+                break
+            self._end_value()
+        self._end_value()
+
+    def _collect_item(self, frame):
+        """Parse a just-closed item of the top-level `items_key` array."""
+        if (
+            len(self._stack) == 2
+            and self._stack[1].closer == "]"
+            and self._stack[1].key == self.items_key
+        ):
+            self._items.append(json.loads("".join(self._out[frame.start :])))
+
+    def _read_string(self, text, i):
+        quote = self._string
+        if self._escape:
+            self._escape = False
+            char = text[i]
+            if char == "'":
+                self._out.append("'")
+            elif char in VALID_ESCAPES:
+                self._out.append("\\" + char)
+            else:
+                self._out.append("\\\\" + json.dumps(char)[1:-1])
+            return i + 1
+
+        run = (DOUBLE_QUOTED_RUN if quote == '"' else SINGLE_QUOTED_RUN).match(text, i)
+        if run:
+            self._out.append(run.group(0))
+            return run.end()
+
+        char = text[i]
+        if char == quote:
+            self._pending_close = ""
+        elif char == "\\":
+            self._escape = True
+        elif char == '"':
+            self._out.append('\\"')  # Inside a single-quoted string
+        else:
+            self._out.append(json.dumps(char)[1:-1])  # Raw control character
+        return i + 1
+
+    def _resolve_close(self, text, i):
+        """Decide whether the quote before the buffered whitespace ended the string."""
+        char = text[i]
+        if char.isspace():
+            self._pending_close += char
+            return i + 1
+        if (
+            char in STRING_CLOSERS
+            or (char in "\"'" and "\n" in self._pending_close)
+            or (self._string_is_key and self._pending_close)
+        ):
+            # The other cases are a missing comma before the next line's
+            # string, and a key followed by its value without a colon
+            self._close_string()
+        else:
+            # A quote inside the text, e.g. an apostrophe in a single-quoted string
+            inner = '\\"' if self._string == '"' else "'"
+            self._out.append(inner + json.dumps(self._pending_close)[1:-1])
+            self._pending_close = None
+        return i
+
+    def _close_string(self):
+        self._pending_close = None
+        self._string = None
+        self._out.append('"')
+        if self._string_is_key:
+            self._end_key(json.loads("".join(self._out[self._string_start :])))
+        else:
+            self._end_value()
+
+    def _end_word(self):
+        word, self._word = self._word, None
+        self._begin_value()
+        if self._string_is_key:
+            self._out.append(json.dumps(word))
+            self._end_key(word)
+            return
+        if word in LITERALS:
+            self._out.append(LITERALS[word])
+        elif NUMBER.fullmatch(word):
+            self._out.append(word)
+        else:
+            self._out.append(json.dumps(word))
+        self._end_value()
+
+
+def parse_json(text):
+    """Locate, repair and parse the JSON object in `text`."""
+    scanner = JsonScanner()
+    scanner.feed(text)
+    return scanner.close()
@@ -0,0 +1,132 @@
+import math
+import threading
+import time
+from collections import deque
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a request cannot get a token within the allowed wait."""
+
+    def __init__(self, retry_after):
+        super().__init__(
+            f"Rate limit exceeded. Please try again in {retry_after} seconds."
+        )
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+
+    Holds up to `capacity` tokens and refills continuously at
+    `refill_per_second`, so bursts up to the capacity pass immediately and
+    sustained traffic is smoothed to the refill rate. When the bucket is
+    empty, up to `max_waiters` callers queue in arrival order for at most
+    `max_wait` seconds each; anyone beyond that is rejected at once.
+    """
+
+    def __init__(self, capacity, refill_per_second, max_waiters=0, max_wait=0):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.max_waiters = max_waiters
+        self.max_wait = max_wait
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._condition = threading.Condition()
+        self._waiters = deque()
+
+    def acquire(self):
+        """Take one token, waiting in line if allowed, or raise RateLimitExceeded."""
+        with self._condition:
+            self._refill()
+            if not self._waiters and self._tokens >= 1:
+                self._tokens -= 1
+                return
+
+            # Tokens needed for everyone ahead of us, plus our own
+            wait = (len(self._waiters) + 1 - self._tokens) / self.refill_per_second
+            if len(self._waiters) >= self.max_waiters or wait > self.max_wait:
+                raise RateLimitExceeded(max(1, math.ceil(wait)))
+
+            ticket = object()
+            self._waiters.append(ticket)
+            try:
+                while True:
+                    self._refill()
+                    if self._waiters[0] is ticket:
+                        if self._tokens >= 1:
+                            self._tokens -= 1
+                            return
+                        self._condition.wait(
+                            (1 - self._tokens) / self.refill_per_second
+                        )
+                    else:
+                        self._condition.wait()
+            finally:
+                self._waiters.remove(ticket)
+                self._condition.notify_all()
+
+    def available(self):
+        """Number of whole tokens currently available."""
+        with self._condition:
+            self._refill()
+            return int(self._tokens)
+
+    def _refill(self):
+        """Add the tokens earned since the last refill. Caller holds the lock."""
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity,
+            self._tokens + (now - self._updated) * self.refill_per_second,
+        )
+        self._updated = now
+
+
+class RateLimiter:
+    """
+    One token bucket per model.
+
+    `budgets` maps a model name to (requests, period_seconds); models not
+    listed get `default_budget`. Each bucket allows a burst of `requests`
+    and refills at requests / period_seconds. With `max_wait` None, callers
+    may wait up to the time one token takes to refill in their bucket, so
+    the first ones past a burst are queued rather than rejected.
+    """
+
+    def __init__(self, default_budget, budgets=None, max_waiters=0, max_wait=None):
+        self.default_budget = default_budget
+        self.budgets = dict(budgets or {})
+        self.max_waiters = max_waiters
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def acquire(self, model):
+        """Take a token from `model`'s bucket, or raise RateLimitExceeded."""
+        self.bucket(model).acquire()
+
+    def bucket(self, model):
+        with self._lock:
+            bucket = self._buckets.get(model)
+            if bucket is None:
+                requests, period = self.budgets.get(model, self.default_budget)
+                max_wait = self.max_wait
+                if max_wait is None:
+                    max_wait = period / requests
+                bucket = self._buckets[model] = TokenBucket(
+                    requests,
+                    requests / period,
+                    max_waiters=self.max_waiters,
+                    max_wait=max_wait,
+                )
+            return bucket
+
+
+def parse_budgets(value):
+    """Parse "model=requests/seconds,..." into {model: (requests, seconds)}."""
+    budgets = {}
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        model, _, budget = entry.partition("=")
+        requests, _, period = budget.partition("/")
+        budgets[model.strip()] = (int(requests), float(period or 3600))
+    return budgets
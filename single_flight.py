@@ -0,0 +1,104 @@
+import threading
+
+
+class FlightCancelled(Exception):
+    """Raised to callers waiting on a flight whose leader gave up without a result."""
+
+
+class Flight:
+    """The outcome of one in-progress call, shared by everyone waiting on it."""
+
+    def __init__(self, group, key):
+        self._group = group
+        self._key = key
+        self._done = threading.Event()
+        self._result = None
+        self._error = None
+        self._cancelled = False
+
+    def set_result(self, result):
+        if not self._done.is_set():
+            self._result = result
+            self._finish()
+
+    def set_exception(self, error):
+        if not self._done.is_set():
+            self._error = error
+            self._finish()
+
+    def cancel(self):
+        """Give up the call; waiters get FlightCancelled and may try again."""
+        if not self._done.is_set():
+            self._cancelled = True
+            self._finish()
+
+    def wait(self):
+        """Block until the call finishes, then return its result or raise its error."""
+        self._done.wait()
+        if self._cancelled:
+            raise FlightCancelled()
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+    def _finish(self):
+        if not self._done.is_set():
+            self._group._remove(self._key, self)
+            self._done.set()
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into a single call.
+
+    The first caller for a key (the leader) does the work; callers arriving
+    while it runs wait for, and receive, the leader's result or exception.
+    Once it finishes, the next call for the key starts a new flight. If the
+    leader is cancelled rather than failing, waiters start over, and one of
+    them becomes the new leader.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}  # key -> Flight
+
+    def join(self, key):
+        """
+        Return (flight, is_leader) for `key`. The leader must finish the
+        flight with set_result, set_exception or cancel; others call
+        flight.wait(), and join again on FlightCancelled.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                return flight, False
+            flight = self._flights[key] = Flight(self, key)
+            return flight, True
+
+    def do(self, key, fn, *args, **kwargs):
+        """Call `fn(*args, **kwargs)`, unless a call for `key` is already running."""
+        while True:
+            flight, is_leader = self.join(key)
+            if is_leader:
+                break
+            try:
+                return flight.wait()
+            except FlightCancelled:
+                continue
+
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            flight.set_exception(e)
+            raise
+        except BaseException:
+            # E.g. KeyboardInterrupt; not the call's outcome for the others
+            flight.cancel()
+            raise
+        flight.set_result(result)
+        return result
+
+    def _remove(self, key, flight):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
@@ -32,6 +32,8 @@ class AudioPlayer {
         this.lastChunkEndTime = 0;
         this.isStreamFinished = false;
         this.taskId = null;
+        this.bytesReceived = 0;
+        this.maxStreamRetries = 5;
 
         this.initialized = false;
     }
@@ -171,6 +173,7 @@ class AudioPlayer {
 
         this.isStreamFinished = false;
         this.taskId = taskId;
+        this.bytesReceived = 0;
         this.audio = document.createElement('audio');
         this.mediaSource = new MediaSource();
         this.audio.src = URL.createObjectURL(this.mediaSource);
@@ -239,10 +242,15 @@ class AudioPlayer {
         }
     }
 
-    fetchStream(streamUrl) {
-        console.log('Fetching stream:', streamUrl);
-        fetch(streamUrl)
+    fetchStream(streamUrl, retries = 0) {
+        console.log('Fetching stream:', streamUrl, 'from byte', this.bytesReceived);
+        // Resume from the last byte received; the server keeps the whole stream
+        const url = this.bytesReceived > 0 ? `${streamUrl}?offset=${this.bytesReceived}` : streamUrl;
+        fetch(url)
             .then(response => {
+                if (!response.ok) {
+                    throw new Error(`Stream request failed with status ${response.status}`);
+                }
                 const reader = response.body.getReader();
                 const read = () => {
                     if (this.isAppending && this.audioQueue.length > 0) {
@@ -257,6 +265,8 @@ class AudioPlayer {
                             return;
                         }
 
+                        this.bytesReceived += value.byteLength;
+                        retries = 0;
                         this.audioQueue.push(value);
                         if (!this.isAppending) {
                             this.appendNextChunk();
@@ -264,17 +274,26 @@ class AudioPlayer {
                         read();
                     }).catch(error => {
                         console.error('Error in reader.read():', error);
-                        this.cleanupMediaSource();
+                        this.retryStream(streamUrl, retries);
                     });
                 };
                 read();
             })
             .catch(error => {
                 console.error('Error fetching stream:', error);
-                this.cleanupMediaSource();
+                this.retryStream(streamUrl, retries);
             });
     }
 
+    retryStream(streamUrl, retries) {
+        if (this.mediaSource && retries < this.maxStreamRetries) {
+            console.log(`Reconnecting stream (attempt ${retries + 1})`);
+            setTimeout(() => this.fetchStream(streamUrl, retries + 1), 1000 * (retries + 1));
+        } else {
+            this.cleanupMediaSource();
+        }
+    }
+
     cleanupMediaSource() {
         if (this.sourceBuffer) {
             try {
@@ -0,0 +1,434 @@
+import json
+import queue
+import socket
+import sqlite3
+import threading
+import time
+from urllib.parse import urlparse, unquote
+
+
+class TaskStore:
+    """
+    Storage for audio task metadata and each task's log of stream chunks.
+
+    Task info is a flat dict of JSON-serializable fields. Stream chunks are
+    appended to a per-task log that is never consumed, so any number of
+    listeners can read it from any chunk offset (and reconnect later);
+    appending None marks the end of the stream. Backends other than
+    MemoryTaskStore can be shared by several worker processes.
+
+    Listeners registered with add_listener are called with the task ID
+    whenever this process appends a chunk or updates a task. Changes made by
+    other processes are not reported and must be picked up by polling.
+    """
+
+    # Whether other processes can change tasks (so listeners may miss
+    # changes) and calls may block on I/O
+    shared = True
+
+    poll_interval = 0.1  # seconds between checks in read_chunks
+
+    def __init__(self):
+        self._listeners = []
+
+    def add_listener(self, listener):
+        """Call `listener(task_id)` after local chunk appends and task updates."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self._listeners.remove(listener)
+
+    def _notify(self, task_id):
+        for listener in list(self._listeners):
+            listener(task_id)
+
+    def create(self, task_id, info):
+        raise NotImplementedError
+
+    def get(self, task_id):
+        """Return the task info dict, or None if the task does not exist."""
+        raise NotImplementedError
+
+    def update(self, task_id, **fields):
+        raise NotImplementedError
+
+    def delete(self, task_id):
+        raise NotImplementedError
+
+    def task_ids(self):
+        raise NotImplementedError
+
+    def append_chunk(self, task_id, data):
+        """Append a chunk of stream data, or None to signal the end of the stream."""
+        raise NotImplementedError
+
+    def read_chunks(self, task_id, offset=0, timeout=None):
+        """
+        Return the chunks from index `offset` on, waiting up to `timeout`
+        seconds (0 never blocks) for at least one to exist.
+
+        The last item is None once the stream has ended. Raises queue.Empty
+        if no chunk arrived in time.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            chunks = self._chunks_from(task_id, offset)
+            if chunks:
+                return chunks
+            if deadline is not None and time.monotonic() >= deadline:
+                raise queue.Empty
+            time.sleep(self.poll_interval)
+
+    def _chunks_from(self, task_id, offset):
+        raise NotImplementedError
+
+    def __contains__(self, task_id):
+        return self.get(task_id) is not None
+
+    def delete_expired(self, max_age):
+        """Delete tasks whose timestamp is older than `max_age` seconds."""
+        now = time.time()
+        expired_tasks = []
+        for task_id in self.task_ids():
+            task_info = self.get(task_id)
+            if (
+                task_info
+                and "timestamp" in task_info
+                and now - task_info["timestamp"] > max_age
+            ):
+                expired_tasks.append(task_id)
+
+        for task_id in expired_tasks:
+            self.delete(task_id)
+        return expired_tasks
+
+
+class MemoryTaskStore(TaskStore):
+    """Keeps tasks in this process. Only usable with a single worker process."""
+
+    shared = False
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Condition()  # notified when a chunk is appended
+        self._tasks = {}
+        self._chunk_logs = {}
+
+    def create(self, task_id, info):
+        with self._lock:
+            self._tasks[task_id] = dict(info)
+            self._chunk_logs[task_id] = []
+
+    def get(self, task_id):
+        with self._lock:
+            task_info = self._tasks.get(task_id)
+            return dict(task_info) if task_info is not None else None
+
+    def update(self, task_id, **fields):
+        with self._lock:
+            if task_id in self._tasks:
+                self._tasks[task_id].update(fields)
+        self._notify(task_id)
+
+    def delete(self, task_id):
+        with self._lock:
+            self._tasks.pop(task_id, None)
+            self._chunk_logs.pop(task_id, None)
+            self._lock.notify_all()
+
+    def task_ids(self):
+        with self._lock:
+            return list(self._tasks)
+
+    def append_chunk(self, task_id, data):
+        with self._lock:
+            chunk_log = self._chunk_logs.get(task_id)
+            if chunk_log is None:
+                return
+            chunk_log.append(data)
+            self._lock.notify_all()
+        self._notify(task_id)
+
+    def read_chunks(self, task_id, offset=0, timeout=None):
+        with self._lock:
+            available = self._lock.wait_for(
+                lambda: task_id not in self._chunk_logs
+                or len(self._chunk_logs[task_id]) > offset,
+                timeout,
+            )
+            if not available:
+                raise queue.Empty
+            chunk_log = self._chunk_logs.get(task_id)
+            # A deleted task reads as an ended stream
+            return [None] if chunk_log is None else chunk_log[offset:]
+
+
+class SQLiteTaskStore(TaskStore):
+    """
+    Keeps tasks in a SQLite database, so every worker process on the host
+    sees the same tasks. Chunk reads poll the database.
+    """
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS tasks (task_id TEXT PRIMARY KEY, info TEXT NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunk_log ("
+                "task_id TEXT NOT NULL, chunk_index INTEGER NOT NULL, data BLOB, "
+                "PRIMARY KEY (task_id, chunk_index))"
+            )
+
+    def _connect(self):
+        # sqlite3 connections cannot be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def create(self, task_id, info):
+        self._connect().execute(
+            "INSERT OR REPLACE INTO tasks (task_id, info) VALUES (?, ?)",
+            (task_id, json.dumps(info)),
+        )
+
+    def get(self, task_id):
+        row = (
+            self._connect()
+            .execute("SELECT info FROM tasks WHERE task_id = ?", (task_id,))
+            .fetchone()
+        )
+        return json.loads(row[0]) if row else None
+
+    def update(self, task_id, **fields):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT info FROM tasks WHERE task_id = ?", (task_id,)
+            ).fetchone()
+            if row:
+                task_info = json.loads(row[0])
+                task_info.update(fields)
+                conn.execute(
+                    "UPDATE tasks SET info = ? WHERE task_id = ?",
+                    (json.dumps(task_info), task_id),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._notify(task_id)
+
+    def delete(self, task_id):
+        conn = self._connect()
+        conn.execute("DELETE FROM tasks WHERE task_id = ?", (task_id,))
+        conn.execute("DELETE FROM chunk_log WHERE task_id = ?", (task_id,))
+
+    def task_ids(self):
+        rows = self._connect().execute("SELECT task_id FROM tasks").fetchall()
+        return [row[0] for row in rows]
+
+    def append_chunk(self, task_id, data):
+        # Index and insert in one statement, so concurrent appends cannot collide
+        self._connect().execute(
+            "INSERT INTO chunk_log (task_id, chunk_index, data) "
+            "SELECT ?, COALESCE(MAX(chunk_index) + 1, 0), ? FROM chunk_log WHERE task_id = ?",
+            (task_id, None if data is None else bytes(data), task_id),
+        )
+        self._notify(task_id)
+
+    def _chunks_from(self, task_id, offset):
+        rows = (
+            self._connect()
+            .execute(
+                "SELECT data FROM chunk_log WHERE task_id = ? AND chunk_index >= ? "
+                "ORDER BY chunk_index",
+                (task_id, offset),
+            )
+            .fetchall()
+        )
+        return [row[0] for row in rows]
+
+
+class RespConnection:
+    """Minimal client for the Redis serialization protocol (RESP)."""
+
+    def __init__(self, host, port, db=0, password=None, timeout=None):
+        self._sock = socket.create_connection((host, port), timeout=timeout)
+        self._file = self._sock.makefile("rb")
+        if password:
+            self.execute("AUTH", password)
+        if db:
+            self.execute("SELECT", db)
+
+    def execute(self, *args):
+        """Send a command and return its decoded reply."""
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            if isinstance(arg, str):
+                arg = arg.encode()
+            elif not isinstance(arg, (bytes, bytearray, memoryview)):
+                arg = str(arg).encode()
+            parts.append(f"${len(arg)}\r\n".encode())
+            parts.append(bytes(arg))
+            parts.append(b"\r\n")
+        self._sock.sendall(b"".join(parts))
+        return self._read_reply()
+
+    def _read_reply(self):
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("Connection closed by server")
+        prefix, payload = line[:1], line[1:-2]
+        if prefix == b"+":
+            return payload.decode()
+        if prefix == b"-":
+            raise Exception(f"Redis error: {payload.decode()}")
+        if prefix == b":":
+            return int(payload)
+        if prefix == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self._file.read(length + 2)
+            return data[:-2]
+        if prefix == b"*":
+            length = int(payload)
+            if length < 0:
+                return None
+            return [self._read_reply() for _ in range(length)]
+        raise Exception(f"Unexpected Redis reply: {line!r}")
+
+    def close(self):
+        self._file.close()
+        self._sock.close()
+
+
+class RedisTaskStore(TaskStore):
+    """
+    Keeps tasks in Redis (or any server speaking the Redis protocol), so
+    tasks can be shared across processes and hosts.
+
+    Task info lives in a hash with one JSON-encoded value per field, so
+    concurrent updates of different fields do not overwrite each other.
+    The chunk log is a list read with LRANGE; an empty value marks the end
+    of the stream.
+    """
+
+    def __init__(
+        self,
+        host="localhost",
+        port=6379,
+        db=0,
+        password=None,
+        prefix="xodcast",
+        key_ttl=86400,
+    ):
+        super().__init__()
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.prefix = prefix
+        # Safety net so keys of abandoned tasks do not live forever
+        self.key_ttl = key_ttl
+        self._local = threading.local()
+
+    def _conn(self):
+        # Connections are not thread-safe, so each thread gets its own
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = RespConnection(self.host, self.port, self.db, self.password)
+            self._local.conn = conn
+        return conn
+
+    def _execute(self, *args):
+        try:
+            return self._conn().execute(*args)
+        except (ConnectionError, OSError):
+            # Reconnect once on a dropped connection
+            self._local.conn = None
+            return self._conn().execute(*args)
+
+    def _task_key(self, task_id):
+        return f"{self.prefix}:task:{task_id}"
+
+    def _chunks_key(self, task_id):
+        return f"{self.prefix}:chunks:{task_id}"
+
+    def _index_key(self):
+        return f"{self.prefix}:tasks"
+
+    def create(self, task_id, info):
+        self._execute("DEL", self._task_key(task_id), self._chunks_key(task_id))
+        self._set_fields(task_id, info)
+        self._execute("SADD", self._index_key(), task_id)
+
+    def get(self, task_id):
+        reply = self._execute("HGETALL", self._task_key(task_id))
+        if not reply:
+            return None
+        return {
+            reply[i].decode(): json.loads(reply[i + 1]) for i in range(0, len(reply), 2)
+        }
+
+    def update(self, task_id, **fields):
+        # Do not resurrect a task that was deleted while still running
+        if fields and self._execute("EXISTS", self._task_key(task_id)):
+            self._set_fields(task_id, fields)
+            self._notify(task_id)
+
+    def _set_fields(self, task_id, fields):
+        args = []
+        for key, value in fields.items():
+            args.extend([key, json.dumps(value)])
+        self._execute("HSET", self._task_key(task_id), *args)
+        self._execute("EXPIRE", self._task_key(task_id), self.key_ttl)
+
+    def delete(self, task_id):
+        self._execute("DEL", self._task_key(task_id), self._chunks_key(task_id))
+        self._execute("SREM", self._index_key(), task_id)
+
+    def task_ids(self):
+        return [
+            task_id.decode() for task_id in self._execute("SMEMBERS", self._index_key())
+        ]
+
+    def append_chunk(self, task_id, data):
+        self._execute("RPUSH", self._chunks_key(task_id), b"" if data is None else data)
+        self._execute("EXPIRE", self._chunks_key(task_id), self.key_ttl)
+        self._notify(task_id)
+
+    def _chunks_from(self, task_id, offset):
+        chunks = self._execute("LRANGE", self._chunks_key(task_id), offset, -1)
+        return [chunk if chunk else None for chunk in chunks]
+
+
+def create_task_store(url):
+    """
+    Create a task store from a URL:
+
+        memory://                       (default, single process only)
+        sqlite:///relative/tasks.db or sqlite:////absolute/tasks.db
+        redis://[:password@]host[:port][/db]
+    """
+    parsed = urlparse(url)
+    if parsed.scheme == "memory":
+        return MemoryTaskStore()
+    if parsed.scheme == "sqlite":
+        return SQLiteTaskStore(parsed.path[1:])
+    if parsed.scheme == "redis":
+        return RedisTaskStore(
+            host=parsed.hostname or "localhost",
+            port=parsed.port or 6379,
+            db=int(parsed.path.lstrip("/") or 0),
+            password=unquote(parsed.password) if parsed.password else None,
+        )
+    raise ValueError(f"Unsupported task store URL: {url}")
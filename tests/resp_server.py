@@ -0,0 +1,108 @@
+import socketserver
+import threading
+
+
+class RespServer:
+    """
+    In-process stand-in for a Redis server, for testing RedisTaskStore.
+
+    Speaks enough of the Redis protocol (RESP) for the commands the task
+    store uses. Key expiry is accepted but not enforced.
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                while True:
+                    command = server.read_command(self.rfile)
+                    if command is None:
+                        return
+                    with server.lock:
+                        reply = server.execute(command)
+                    self.wfile.write(encode(reply))
+
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self.host, self.port = self._server.server_address
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def read_command(self, rfile):
+        line = rfile.readline()
+        if not line:
+            return None
+        count = int(line[1:])
+        args = []
+        for _ in range(count):
+            length = int(rfile.readline()[1:])
+            args.append(rfile.read(length + 2)[:-2])
+        return args
+
+    def execute(self, args):
+        name = args[0].decode().upper()
+        keys = [arg.decode() for arg in args[1:2]]
+        key = keys[0] if keys else None
+        if name in ("PING", "AUTH", "SELECT"):
+            return "+OK"
+        if name == "DEL":
+            return sum(self.data.pop(k.decode(), None) is not None for k in args[1:])
+        if name == "EXISTS":
+            return int(key in self.data)
+        if name == "EXPIRE":
+            return int(key in self.data)
+        if name == "HSET":
+            fields = self.data.setdefault(key, {})
+            added = 0
+            for i in range(2, len(args), 2):
+                added += args[i] not in fields
+                fields[args[i]] = args[i + 1]
+            return added
+        if name == "HGETALL":
+            return [item for pair in self.data.get(key, {}).items() for item in pair]
+        if name == "SADD":
+            members = self.data.setdefault(key, set())
+            added = len(set(args[2:]) - members)
+            members.update(args[2:])
+            return added
+        if name == "SREM":
+            members = self.data.get(key, set())
+            removed = len(members & set(args[2:]))
+            members.difference_update(args[2:])
+            return removed
+        if name == "SMEMBERS":
+            return list(self.data.get(key, set()))
+        if name == "RPUSH":
+            items = self.data.setdefault(key, [])
+            items.extend(args[2:])
+            return len(items)
+        if name == "LRANGE":
+            items = self.data.get(key, [])
+            start, stop = int(args[2]), int(args[3])
+            stop = len(items) if stop == -1 else stop + 1
+            return items[start:stop]
+        return Exception(f"ERR unknown command '{name}'")
+
+
+def encode(reply):
+    if isinstance(reply, Exception):
+        return f"-{reply}\r\n".encode()
+    if isinstance(reply, str):
+        return f"{reply}\r\n".encode()
+    if isinstance(reply, int):
+        return f":{reply}\r\n".encode()
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, bytes):
+        return b"$%d\r\n%s\r\n" % (len(reply), reply)
+    return b"*%d\r\n" % len(reply) + b"".join(encode(item) for item in reply)
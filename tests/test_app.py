@@ -0,0 +1,22 @@
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("google.cloud.texttospeech")
+
+import app as app_module
+
+
+@pytest.fixture
+def client():
+    return app_module.app.test_client()
+
+
+def test_cache_stats(client):
+    response = client.get("/cache_stats")
+    assert response.status_code == 200
+    audio = response.json["audio"]
+    assert audio["max_bytes"] == app_module.audio_cache.max_bytes
+    assert {"hits", "misses", "evictions", "entries", "bytes"} <= audio.keys()
+    script = response.json["script"]
+    assert script["max_memory_entries"] == app_module.script_cache.max_memory_entries
+    assert {"memory_hits", "hits", "misses", "entries"} <= script.keys()
@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("google.cloud.texttospeech")
+
+from audio_assembly import FULL_SCALE, TurnAssembler, assembler_from_settings
+
+SAMPLE_RATE = 1000  # 10 samples per frame keeps the arithmetic readable
+
+
+def assembler(**kwargs):
+    options = dict(trim=False, normalize=False, sample_rate=SAMPLE_RATE, channel_count=1)
+    options.update(kwargs)
+    return TurnAssembler(**options)
+
+
+def pcm(*parts):
+    """16-bit PCM from (sample count, amplitude) parts, as square waves."""
+    samples = []
+    for count, amplitude in parts:
+        wave = np.full(count, amplitude * FULL_SCALE)
+        wave[1::2] *= -1
+        samples.append(wave)
+    return np.rint(np.concatenate(samples)).clip(-FULL_SCALE, FULL_SCALE - 1).astype("<i2").tobytes()
+
+
+def samples(data):
+    return np.frombuffer(data, dtype="<i2")
+
+
+def test_trims_silence_around_speech_with_padding():
+    data = assembler(trim=True).add("a", pcm((200, 0), (100, 0.5), (200, 0)))
+    assert len(samples(data)) == 40 + 100 + 40
+
+
+def test_drops_silent_segments_when_trimming():
+    assert assembler(trim=True).add("a", pcm((100, 0))) == b""
+
+
+def test_keeps_silent_segments_without_trimming():
+    silence = pcm((100, 0))
+    assert assembler(normalize=True).add("a", silence) == silence
+
+
+def test_normalizes_towards_target_loudness():
+    data = assembler(normalize=True).add("a", pcm((100, 0.01)))
+    rms = np.sqrt(np.mean(np.square(samples(data) / FULL_SCALE)))
+    assert rms == pytest.approx(0.04, rel=0.01)  # Quiet voices gain at most 12 dB
+
+
+def test_gain_never_clips_the_peak():
+    # Quiet speech would be raised about 10 dB, which would clip its one loud sample
+    data = assembler(normalize=True).add("a", pcm((1000, 0.01), (1, 0.9)))
+    result = samples(data).astype(np.int32)
+    assert result[-1] == FULL_SCALE - 1  # Raised only as far as full scale
+    assert np.abs(result[:-1]).max() == round(0.01 / 0.9 * (FULL_SCALE - 1))
+
+
+def test_inserts_gap_on_turn_change():
+    turns = assembler(gap_ms=50)
+    first = turns.add("a", pcm((100, 0.5)))
+    second = turns.add("b", pcm((100, 0.5)))
+    assert len(samples(first)) == 100
+    assert len(samples(second)) == 50 + 100
+    assert not samples(second)[:50].any()
+
+
+def test_crossfades_turns():
+    turns = assembler(crossfade_ms=20)
+    first = turns.add("a", pcm((100, 0.5)))
+    second = turns.add("b", pcm((100, 0.5)))
+    assert len(samples(first)) == 80  # The end is held back for the crossfade
+    assert len(samples(first + second + turns.close())) == 180
+
+
+def test_ignores_a_trailing_odd_byte():
+    assert len(assembler().add("a", pcm((10, 0.5)) + b"\x01")) == 20
+
+
+def test_assembler_from_settings():
+    assert assembler_from_settings({}) is None
+    turns = assembler_from_settings({"trimSilence": True, "turnGap": 100})
+    assert turns.trim and turns.gap
+
+
+def test_multi_speaker_ignores_gap_and_crossfade():
+    settings = {
+        "voiceSelector": {
+            "hostVoice": "en-US-Studio-MultiSpeaker-R",
+            "guestVoice": "en-US-Studio-MultiSpeaker-S",
+        },
+        "turnGap": 100,
+        "crossfade": 50,
+    }
+    assert assembler_from_settings(settings) is None
@@ -0,0 +1,158 @@
+import pytest
+
+from chunk_planner import (
+    TTS_REQUEST_BYTE_LIMIT,
+    ChunkPlanner,
+    split_text,
+    to_emotional_ssml,
+)
+
+HOST = "en-US-Studio-MultiSpeaker-R"
+GUEST = "en-US-Studio-MultiSpeaker-S"
+
+SENTENCES = [
+    "This is sentence number {} of a rather long turn about tomatoes.".format(i)
+    for i in range(200)
+]
+
+
+def turns(*texts):
+    return [
+        {"speaker": "Host" if i % 2 == 0 else "Guest", "text": text}
+        for i, text in enumerate(texts)
+    ]
+
+
+def utf8_size(text):
+    return len(text.encode("utf-8"))
+
+
+def test_split_text_respects_limit_and_keeps_words():
+    text = " ".join(SENTENCES)
+    pieces = split_text(text, 1000)
+    assert all(utf8_size(piece) <= 1000 for piece in pieces)
+    assert " ".join(pieces).split() == text.split()
+
+
+def test_split_text_prefers_sentence_boundaries():
+    pieces = split_text(" ".join(SENTENCES[:20]), 300)
+    assert all(piece.endswith(".") for piece in pieces)
+
+
+def test_split_text_keeps_closing_quotes_with_the_sentence():
+    pieces = split_text('He said "stop." Then he left. ' * 20, 100)
+    assert not any(piece.startswith('"') for piece in pieces)
+
+
+def test_split_text_is_balanced():
+    sizes = [utf8_size(p) for p in split_text(" ".join(SENTENCES[:50]), 1000)]
+    assert max(sizes) - min(sizes) < 100
+
+
+def test_split_text_unbalanced_fills_the_first_piece():
+    pieces = split_text(" ".join(SENTENCES[:50]), 1000, balanced=False)
+    assert utf8_size(pieces[0]) > 900
+
+
+def test_split_text_falls_back_to_words():
+    text = "word " * 500  # No sentence or clause breaks at all
+    pieces = split_text(text.strip(), 100)
+    assert all(utf8_size(piece) <= 100 for piece in pieces)
+    assert " ".join(pieces).split() == text.split()
+
+
+def test_split_text_counts_bytes_not_characters():
+    pieces = split_text("Un café très crémeux, déjà prêt. " * 100, 300)
+    assert all(utf8_size(piece) <= 300 for piece in pieces)
+
+
+@pytest.mark.parametrize("multi_speaker", [False, True])
+def test_plan_keeps_every_request_under_the_limit(multi_speaker):
+    planner = ChunkPlanner(multi_speaker=multi_speaker)
+    conversation = turns(" ".join(SENTENCES), "Short answer.", " ".join(SENTENCES[:40]))
+    chunks = list(planner.plan(conversation, HOST, GUEST))
+    for chunk in chunks:
+        assert planner.request_size(chunk) <= TTS_REQUEST_BYTE_LIMIT
+    spoken = " ".join(entry["text"] for chunk in chunks for entry in chunk)
+    assert spoken.split() == " ".join(t["text"] for t in conversation).split()
+
+
+def test_plan_follows_the_startup_schedule():
+    planner = ChunkPlanner(multi_speaker=True, first_chunk_bytes=300, growth=2)
+    chunks = list(planner.plan(turns(*SENTENCES[:100]), HOST, GUEST))
+    for index, chunk in enumerate(chunks):
+        assert planner.request_size(chunk) <= planner.chunk_limit(index)
+    assert planner.chunk_limit(0) == 300
+    assert planner.chunk_limit(1) == 600
+    assert planner.chunk_limit(10) == TTS_REQUEST_BYTE_LIMIT
+
+
+def test_plan_assigns_voices():
+    planner = ChunkPlanner()
+    chunks = list(planner.plan(turns("Hello.", "Hi."), HOST, GUEST))
+    assert [[entry["speaker"] for entry in chunk] for chunk in chunks] == [
+        [HOST],
+        [GUEST],
+    ]
+
+
+def test_plan_is_lazy():
+    def produce():
+        yield {"speaker": "Host", "text": "First."}
+        raise AssertionError("Only the first turn should be read")
+
+    planner = ChunkPlanner()
+    assert next(planner.plan(produce(), HOST, GUEST)) == [
+        {"text": "First.", "speaker": HOST}
+    ]
+
+
+def test_rendered_ssml_counts_towards_the_limit():
+    planner = ChunkPlanner(render=to_emotional_ssml)
+    chunks = list(planner.plan(turns(" ".join(SENTENCES)), HOST, GUEST))
+    for chunk in chunks:
+        assert all(entry["ssml"] for entry in chunk)
+        assert planner.request_size(chunk) <= TTS_REQUEST_BYTE_LIMIT
+
+
+def test_voices_without_ssml_get_plain_text():
+    planner = ChunkPlanner(render=to_emotional_ssml)
+    chunks = list(
+        planner.plan(turns("Hello!", "Hi!"), "en-US-Studio-O", "en-US-Journey-D")
+    )
+    assert chunks[0][0]["ssml"] is True
+    assert chunks[1] == [{"text": "Hi!", "speaker": "en-US-Journey-D"}]
+
+
+def test_unsplittable_text_raises():
+    planner = ChunkPlanner(byte_limit=50)
+    with pytest.raises(ValueError):
+        list(planner.plan(turns("x" * 100), HOST, GUEST))
+
+
+@pytest.mark.parametrize("multi_speaker", [False, True])
+def test_request_size_matches_protobuf(multi_speaker):
+    texttospeech = pytest.importorskip("google.cloud.texttospeech")
+    planner = ChunkPlanner(multi_speaker=multi_speaker)
+    entries = [
+        {"text": "Hello there, café 🍅.", "speaker": HOST},
+        {"text": "x" * 300, "speaker": GUEST},
+    ]
+    if multi_speaker:
+        message = texttospeech.SynthesisInput(
+            multi_speaker_markup=texttospeech.MultiSpeakerMarkup(
+                turns=[
+                    texttospeech.MultiSpeakerMarkup.Turn(
+                        text=e["text"], speaker=e["speaker"].split("-")[-1]
+                    )
+                    for e in entries
+                ]
+            )
+        )
+        expected = len(texttospeech.SynthesisInput.serialize(message))
+        assert planner.request_size(entries) == expected
+    else:
+        for entry in entries:
+            message = texttospeech.SynthesisInput(text=entry["text"])
+            expected = len(texttospeech.SynthesisInput.serialize(message))
+            assert planner.request_size([entry]) == expected
@@ -0,0 +1,123 @@
+import threading
+
+import pytest
+
+pytest.importorskip("google.cloud.texttospeech")
+
+from google.api_core import exceptions as api_exceptions
+
+from google_tts import TextToSpeechClientPool
+
+
+class FakeTransport:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeClient:
+    def __init__(self, healthy=True):
+        self.healthy = healthy
+        self.transport = FakeTransport()
+
+    def list_voices(self, **kwargs):
+        if not self.healthy:
+            raise api_exceptions.ServiceUnavailable("down")
+
+
+class CountingFactory:
+    def __init__(self):
+        self.clients = []
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            client = FakeClient()
+            self.clients.append(client)
+            return client
+
+
+def test_reuses_returned_clients():
+    factory = CountingFactory()
+    pool = TextToSpeechClientPool(size=2, client_factory=factory)
+    with pool.client() as first:
+        pass
+    with pool.client() as second:
+        assert second is first
+    assert len(factory.clients) == 1
+
+
+def test_never_creates_more_than_size_clients():
+    factory = CountingFactory()
+    pool = TextToSpeechClientPool(size=3, client_factory=factory)
+    busy = 0
+    max_busy = 0
+    lock = threading.Lock()
+    barrier = threading.Barrier(8)
+
+    def borrow():
+        nonlocal busy, max_busy
+        barrier.wait()
+        for _ in range(20):
+            with pool.client():
+                with lock:
+                    busy += 1
+                    max_busy = max(max_busy, busy)
+                with lock:
+                    busy -= 1
+
+    threads = [threading.Thread(target=borrow) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(factory.clients) <= 3
+    assert max_busy <= 3
+
+
+def test_blocked_acquirer_wakes_when_a_client_is_discarded():
+    factory = CountingFactory()
+    pool = TextToSpeechClientPool(size=1, client_factory=factory)
+    acquired = threading.Event()
+    borrowed = []
+
+    def wait_for_client():
+        with pool.client() as client:
+            borrowed.append(client)
+            acquired.set()
+
+    with pytest.raises(api_exceptions.ServiceUnavailable):
+        with pool.client() as broken:
+            waiter = threading.Thread(target=wait_for_client)
+            waiter.start()
+            assert not acquired.wait(0.2)  # The only slot is taken
+            raise api_exceptions.ServiceUnavailable("channel lost")
+
+    assert acquired.wait(5)
+    waiter.join(5)
+    assert broken.transport.closed
+    assert borrowed[0] is not broken  # A fresh client replaced the broken one
+    assert len(factory.clients) == 2
+
+
+def test_other_errors_keep_the_client():
+    factory = CountingFactory()
+    pool = TextToSpeechClientPool(size=1, client_factory=factory)
+    with pytest.raises(ValueError):
+        with pool.client() as client:
+            raise ValueError("bad request")
+    with pool.client() as again:
+        assert again is client
+    assert not client.transport.closed
+
+
+def test_health_check_discards_failing_clients():
+    clients = [FakeClient(healthy=False), FakeClient()]
+    pool = TextToSpeechClientPool(size=2, client_factory=lambda: clients.pop(0))
+    pool.warm()
+    assert pool.health_check() == 1
+    with pool.client() as client:
+        assert client.healthy
@@ -0,0 +1,86 @@
+import threading
+import time
+
+import pytest
+
+from job_queue import JobExecutor, QueueFull
+
+
+def blocked_executor(max_pending=10):
+    """An executor whose single worker is busy until the returned event is set."""
+    executor = JobExecutor(max_workers=1, max_pending=max_pending)
+    release = threading.Event()
+    started = threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    executor.submit("blocker", block)
+    assert started.wait(5)
+    return executor, release
+
+
+def test_runs_jobs_by_priority_then_submission_order():
+    executor, release = blocked_executor()
+    order = []
+    done = threading.Event()
+    executor.submit("late", order.append, "late", priority=1)
+    executor.submit("first", order.append, "first", priority=0)
+    executor.submit("second", order.append, "second", priority=0)
+    executor.submit("urgent", order.append, "urgent", priority=-1)
+    executor.submit("end", done.set, priority=2)
+    release.set()
+    assert done.wait(5)
+    assert order == ["urgent", "first", "second", "late"]
+
+
+def test_full_queue_raises_with_retry_after():
+    executor, release = blocked_executor(max_pending=2)
+    executor.submit("a", lambda: None)
+    executor.submit("b", lambda: None)
+    with pytest.raises(QueueFull) as error:
+        executor.submit("c", lambda: None)
+    assert error.value.retry_after == 30  # No jobs finished yet to estimate from
+    release.set()
+
+
+def test_retry_after_follows_job_durations():
+    executor = JobExecutor(max_workers=1, max_pending=1)
+    done = threading.Event()
+    executor.submit("slow", lambda: (time.sleep(1.2), done.set()))
+    assert done.wait(5)
+    time.sleep(0.1)  # Let the worker record the duration
+
+    release = threading.Event()
+    executor.submit("blocker", release.wait, 5)
+    time.sleep(0.1)
+    executor.submit("waiting", lambda: None)
+    with pytest.raises(QueueFull) as error:
+        executor.submit("rejected", lambda: None)
+    assert error.value.retry_after == 2  # ceil(1.2 seconds / 1 worker)
+    release.set()
+
+
+def test_position_and_depth():
+    executor, release = blocked_executor()
+    executor.submit("a", lambda: None, priority=1)
+    executor.submit("b", lambda: None, priority=0)
+    assert executor.position("blocker") == 0  # Running
+    assert executor.position("b") == 1
+    assert executor.position("a") == 2
+    assert executor.position("unknown") is None
+    assert executor.depth() == 2
+    release.set()
+
+
+def test_failing_job_does_not_stop_the_worker():
+    executor = JobExecutor(max_workers=1)
+    done = threading.Event()
+
+    def fail():
+        raise RuntimeError("boom")
+
+    executor.submit("fail", fail)
+    executor.submit("next", done.set)
+    assert done.wait(5)
@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+from json_scanner import JsonScanner, parse_json
+
+SCRIPT = {
+    "title": "Tomatoes",
+    "conversation": [
+        {"speaker": "Host", "text": "Welcome! Today: tomatoes."},
+        {"speaker": "Guest", "text": 'They\'re "fruit", technically.\nReally.'},
+        {"speaker": "Host", "text": "Unicode too: café, 東京, 🍅"},
+    ],
+}
+
+
+def test_parses_valid_json():
+    assert parse_json(json.dumps(SCRIPT)) == SCRIPT
+
+
+def test_skips_prose_and_fences():
+    text = f"Sure! Here it is:\n```json\n{json.dumps(SCRIPT, indent=2)}\n```\nEnjoy."
+    assert parse_json(text) == SCRIPT
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ('{"a": 1 "b": 2}', {"a": 1, "b": 2}),  # Missing comma
+        ('{"a": 1,, "b": 2,}', {"a": 1, "b": 2}),  # Doubled and trailing commas
+        ('{"a" 1}', {"a": 1}),  # Missing colon
+        ("{'a': 'it's here'}", {"a": "it's here"}),  # Single quotes
+        ("{a: hello}", {"a": "hello"}),  # Unquoted key and value
+        ("{'a': True, 'b': None}", {"a": True, "b": None}),  # Python literals
+        ('{"a": "line\nbreak"}', {"a": "line\nbreak"}),  # Raw newline
+        ('{"a": "say "hi" now"}', {"a": 'say "hi" now'}),  # Inner quotes
+        ('{"a": "C:\\path"}', {"a": "C:\\path"}),  # Invalid escape
+        ('{"a": [1, 2}', {"a": [1, 2]}),  # Mismatched bracket
+    ],
+)
+def test_repairs(text, expected):
+    assert parse_json(text) == expected
+
+
+def test_feed_returns_items_as_they_complete():
+    text = json.dumps(SCRIPT)
+    scanner = JsonScanner()
+    items = []
+    for char in text:  # The worst case of streaming: one character at a time
+        items.extend(scanner.feed(char))
+    assert items == SCRIPT["conversation"]
+    assert scanner.close() == SCRIPT
+
+
+def test_items_arrive_before_the_response_ends():
+    scanner = JsonScanner()
+    first = json.dumps(SCRIPT["conversation"][0])
+    assert scanner.feed('{"conversation": [' + first[:-1]) == []
+    assert scanner.feed("}, {") == [SCRIPT["conversation"][0]]
+
+
+def test_only_top_level_items_are_returned():
+    text = '{"meta": {"conversation": [{"x": 1}]}, "conversation": [{"y": 2}]}'
+    scanner = JsonScanner()
+    assert scanner.feed(text) == [{"y": 2}]
+
+
+def test_incomplete_object_raises():
+    scanner = JsonScanner()
+    scanner.feed('{"conversation": [{"speaker": "Host"')
+    with pytest.raises(ValueError):
+        scanner.close()
+
+
+def test_missing_object_raises():
+    with pytest.raises(ValueError):
+        parse_json("No JSON here")
@@ -0,0 +1,77 @@
+import pytest
+
+pytest.importorskip("google.cloud.texttospeech")
+
+from google_tts import PassthroughFile, PassthroughStream, mp3_frame_info, strip_mp3_headers
+
+# MPEG-1 Layer III, 128 kbit/s, 44.1 kHz, stereo, no CRC: 417-byte frames
+# with the Xing/Info marker after 32 bytes of side information
+FRAME_HEADER = b"\xff\xfb\x90\x00"
+FRAME_LENGTH = 417
+
+
+def id3_tag(body=b"TIT2 title", footer=False):
+    size = len(body)
+    syncsafe = bytes((size >> shift) & 0x7F for shift in (21, 14, 7, 0))
+    flags = 0x10 if footer else 0
+    header = b"ID3\x04\x00" + bytes([flags]) + syncsafe
+    return header + body + (b"3DI" + header[3:] if footer else b"")
+
+
+def info_frame(marker=b"Info"):
+    frame = FRAME_HEADER + bytes(32) + marker
+    return frame + bytes(FRAME_LENGTH - len(frame))
+
+
+def audio_frame(fill):
+    return FRAME_HEADER + bytes([fill]) * (FRAME_LENGTH - 4)
+
+
+def mp3_chunk(fill, marker=b"Info", footer=False):
+    return id3_tag(footer=footer) + info_frame(marker) + audio_frame(fill)
+
+
+def test_frame_info():
+    assert mp3_frame_info(FRAME_HEADER) == (FRAME_LENGTH, 32)
+    # MPEG-2, 64 kbit/s, 24 kHz, mono: 192-byte frames, 9 bytes of side information
+    assert mp3_frame_info(b"\xff\xf3\x84\xc0") == (192, 9)
+    assert mp3_frame_info(b"ID3\x04") is None
+
+
+@pytest.mark.parametrize("marker", [b"Xing", b"Info"])
+def test_strips_tag_and_info_frame(marker):
+    assert bytes(strip_mp3_headers(mp3_chunk(1, marker))) == audio_frame(1)
+
+
+def test_strips_tag_with_footer():
+    assert bytes(strip_mp3_headers(mp3_chunk(1, footer=True))) == audio_frame(1)
+
+
+def test_keeps_first_tag_when_asked():
+    stripped = strip_mp3_headers(mp3_chunk(1), keep_id3=True)
+    assert stripped == id3_tag() + audio_frame(1)
+
+
+def test_leaves_plain_audio_alone():
+    audio = audio_frame(1) + audio_frame(2)
+    assert bytes(strip_mp3_headers(audio)) == audio
+
+
+def test_passthrough_file_concatenates_chunks(tmp_path):
+    output_file = tmp_path / "podcast.mp3"
+    chunk_file = tmp_path / "chunk.mp3"
+    chunk_file.write_bytes(mp3_chunk(3, b"Xing"))
+    with PassthroughFile(output_file) as file_writer:
+        file_writer.append(mp3_chunk(1))
+        file_writer.append(memoryview(mp3_chunk(2)))
+        file_writer.append(str(chunk_file))
+    expected = id3_tag() + audio_frame(1) + audio_frame(2) + audio_frame(3)
+    assert output_file.read_bytes() == expected
+
+
+def test_passthrough_stream_concatenates_chunks():
+    sent = []
+    stream = PassthroughStream(sent.append)
+    stream.append(mp3_chunk(1))
+    stream.append(mp3_chunk(2))
+    assert sent == [id3_tag() + audio_frame(1), audio_frame(2)]
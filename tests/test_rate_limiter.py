@@ -0,0 +1,102 @@
+import threading
+import time
+
+import pytest
+
+from rate_limiter import RateLimiter, RateLimitExceeded, TokenBucket, parse_budgets
+
+
+def test_burst_up_to_capacity_then_reject():
+    bucket = TokenBucket(3, refill_per_second=0.001)
+    for _ in range(3):
+        bucket.acquire()
+    with pytest.raises(RateLimitExceeded) as error:
+        bucket.acquire()
+    assert error.value.retry_after >= 1
+
+
+def test_refills_over_time():
+    bucket = TokenBucket(1, refill_per_second=20)
+    bucket.acquire()
+    assert bucket.available() == 0
+    time.sleep(0.1)
+    assert bucket.available() == 1
+
+
+def test_waiter_gets_the_next_token():
+    bucket = TokenBucket(1, refill_per_second=10, max_waiters=1, max_wait=1)
+    bucket.acquire()
+    started = time.monotonic()
+    bucket.acquire()  # Waits about 0.1 s for the refill
+    assert 0.05 < time.monotonic() - started < 0.5
+
+
+def test_waiters_beyond_the_queue_are_rejected():
+    bucket = TokenBucket(1, refill_per_second=5, max_waiters=1, max_wait=5)
+    bucket.acquire()
+    waiter = threading.Thread(target=bucket.acquire)
+    waiter.start()
+    time.sleep(0.05)
+    with pytest.raises(RateLimitExceeded):
+        bucket.acquire()
+    waiter.join()
+
+
+def test_waits_longer_than_max_wait_are_rejected():
+    bucket = TokenBucket(1, refill_per_second=0.5, max_waiters=5, max_wait=1)
+    bucket.acquire()
+    with pytest.raises(RateLimitExceeded) as error:
+        bucket.acquire()
+    assert error.value.retry_after == 2
+
+
+def test_waiters_are_served_in_arrival_order():
+    bucket = TokenBucket(1, refill_per_second=20, max_waiters=5, max_wait=5)
+    bucket.acquire()
+    order = []
+
+    def acquire(name):
+        bucket.acquire()
+        order.append(name)
+
+    threads = []
+    for name in range(4):
+        thread = threading.Thread(target=acquire, args=(name,))
+        thread.start()
+        threads.append(thread)
+        time.sleep(0.01)
+    for thread in threads:
+        thread.join()
+    assert order == [0, 1, 2, 3]
+
+
+def test_rate_limiter_keeps_a_bucket_per_model():
+    limiter = RateLimiter((1, 3600), {"fast": (2, 3600)})
+    limiter.acquire("fast")
+    limiter.acquire("fast")
+    limiter.acquire("slow")
+    with pytest.raises(RateLimitExceeded):
+        limiter.acquire("fast")
+    with pytest.raises(RateLimitExceeded):
+        limiter.acquire("slow")
+
+
+def test_default_max_wait_queues_the_first_request_past_a_burst():
+    # The shape of the default 60 requests per hour, scaled down
+    limiter = RateLimiter((6, 0.6), max_waiters=10)
+    for _ in range(6):
+        limiter.acquire("m")
+    started = time.monotonic()
+    limiter.acquire("m")  # Waits about 0.1 s for the next token
+    assert 0.05 < time.monotonic() - started < 0.5
+
+
+def test_default_max_wait_is_one_refill_interval():
+    limiter = RateLimiter((60, 3600), max_waiters=10)
+    assert limiter.bucket("m").max_wait == 60
+    assert RateLimiter((60, 3600), max_wait=5).bucket("m").max_wait == 5
+
+
+def test_parse_budgets():
+    assert parse_budgets("a=10/60, b=5,") == {"a": (10, 60.0), "b": (5, 3600.0)}
+    assert parse_budgets("") == {}
@@ -0,0 +1,110 @@
+import threading
+import time
+
+import pytest
+
+from single_flight import FlightCancelled, SingleFlight
+
+
+def run_followers(group, key, count, fn):
+    """Start `count` threads calling group.do(key, fn); return (threads, results)."""
+    results = []
+
+    def call():
+        try:
+            results.append(group.do(key, fn))
+        except Exception as e:
+            results.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def test_concurrent_calls_share_one_call():
+    group = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def work():
+        calls.append(1)
+        release.wait(5)
+        return "script"
+
+    threads, results = run_followers(group, "k", 6, work)
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert calls == [1]
+    assert results == ["script"] * 6
+
+
+def test_exception_reaches_every_caller():
+    group = SingleFlight()
+    release = threading.Event()
+
+    def work():
+        release.wait(5)
+        raise ValueError("boom")
+
+    threads, results = run_followers(group, "k", 3, work)
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(results) == 3
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_different_keys_do_not_wait_for_each_other():
+    group = SingleFlight()
+    flight, is_leader = group.join("a")
+    assert is_leader
+    assert group.do("b", lambda: "b") == "b"
+    flight.set_result("a")
+
+
+def test_next_call_after_a_flight_starts_a_new_one():
+    group = SingleFlight()
+    assert group.do("k", lambda: 1) == 1
+    assert group.do("k", lambda: 2) == 2
+
+
+def test_join_reports_the_leader():
+    group = SingleFlight()
+    flight, is_leader = group.join("k")
+    follower_flight, follower_is_leader = group.join("k")
+    assert is_leader and not follower_is_leader
+    assert follower_flight is flight
+    flight.set_result("done")
+    assert follower_flight.wait() == "done"
+
+
+def test_cancelled_flight_raises_flight_cancelled():
+    group = SingleFlight()
+    flight, _ = group.join("k")
+    flight.cancel()
+    with pytest.raises(FlightCancelled):
+        flight.wait()
+
+
+def test_follower_takes_over_after_cancel():
+    group = SingleFlight()
+    flight, _ = group.join("k")
+    threads, results = run_followers(group, "k", 2, lambda: "retried")
+    time.sleep(0.1)
+    assert results == []  # Still waiting on the first leader
+    flight.cancel()
+    for thread in threads:
+        thread.join(5)
+    assert results == ["retried", "retried"]
+
+
+def test_results_after_the_flight_ends_are_ignored():
+    group = SingleFlight()
+    flight, _ = group.join("k")
+    flight.set_result("first")
+    flight.set_exception(ValueError("late"))
+    assert flight.wait() == "first"
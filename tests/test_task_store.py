@@ -0,0 +1,118 @@
+import queue
+import threading
+import time
+
+import pytest
+
+from resp_server import RespServer
+from task_store import (
+    MemoryTaskStore,
+    RedisTaskStore,
+    SQLiteTaskStore,
+    create_task_store,
+)
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        yield MemoryTaskStore()
+    elif request.param == "sqlite":
+        yield SQLiteTaskStore(str(tmp_path / "tasks.db"))
+    else:
+        with RespServer() as server:
+            yield RedisTaskStore(host=server.host, port=server.port)
+
+
+def test_create_and_get(store):
+    store.create("a", {"status": "pending", "metadata": {}, "timestamp": 1.5})
+    assert store.get("a") == {"status": "pending", "metadata": {}, "timestamp": 1.5}
+    assert "a" in store
+    assert store.get("missing") is None
+    assert "missing" not in store
+
+
+def test_update_merges_fields(store):
+    store.create("a", {"status": "pending", "metadata": {}})
+    store.update("a", status="in_progress")
+    store.update("a", metadata={"percent": 50.0})
+    assert store.get("a") == {"status": "in_progress", "metadata": {"percent": 50.0}}
+
+
+def test_update_does_not_create_deleted_task(store):
+    store.create("a", {"status": "pending"})
+    store.delete("a")
+    store.update("a", status="completed")
+    assert store.get("a") is None
+
+
+def test_append_and_read_chunks(store):
+    store.create("a", {"status": "pending"})
+    store.append_chunk("a", b"one")
+    store.append_chunk("a", memoryview(b"two"))
+    store.append_chunk("a", None)
+    assert [bytes(c) if c else c for c in store.read_chunks("a", 0, timeout=1)] == [
+        b"one",
+        b"two",
+        None,
+    ]
+    assert [bytes(c) if c else c for c in store.read_chunks("a", 2, timeout=1)] == [
+        None
+    ]
+
+
+def test_read_chunks_times_out(store):
+    store.create("a", {"status": "pending"})
+    with pytest.raises(queue.Empty):
+        store.read_chunks("a", 0, timeout=0.2)
+
+
+def test_read_chunks_waits_for_append(store):
+    store.create("a", {"status": "pending"})
+    timer = threading.Timer(0.1, store.append_chunk, ("a", b"late"))
+    timer.start()
+    try:
+        assert bytes(store.read_chunks("a", 0, timeout=5)[0]) == b"late"
+    finally:
+        timer.join()
+
+
+def test_delete(store):
+    store.create("a", {"status": "pending"})
+    store.append_chunk("a", b"data")
+    store.delete("a")
+    assert store.get("a") is None
+    assert "a" not in store.task_ids()
+
+
+def test_delete_expired(store):
+    now = time.time()
+    store.create("old", {"timestamp": now - 100})
+    store.create("new", {"timestamp": now})
+    store.create("untimed", {"status": "pending"})
+    assert store.delete_expired(50) == ["old"]
+    assert sorted(store.task_ids()) == ["new", "untimed"]
+
+
+def test_listeners_are_notified(store):
+    seen = []
+    store.add_listener(seen.append)
+    store.create("a", {"status": "pending"})
+    store.update("a", status="in_progress")
+    store.append_chunk("a", b"data")
+    assert seen == ["a", "a"]
+
+
+def test_create_task_store_urls(tmp_path):
+    assert isinstance(create_task_store("memory://"), MemoryTaskStore)
+    sqlite_store = create_task_store(f"sqlite:///{tmp_path}/tasks.db")
+    assert isinstance(sqlite_store, SQLiteTaskStore)
+    redis_store = create_task_store("redis://:secret@example.com:6380/2")
+    assert (redis_store.host, redis_store.port, redis_store.db) == (
+        "example.com",
+        6380,
+        2,
+    )
+    assert redis_store.password == "secret"
+    with pytest.raises(ValueError):
+        create_task_store("ftp://example.com")